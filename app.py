@@ -1,18 +1,43 @@
 import subprocess
 import sys
 import os
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for, send_from_directory
+import re
+import string
+import struct
+import hashlib
+import threading
+import time
+import uuid
+import heapq
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import json
+from bisect import bisect_left
+from itertools import islice
+from flask import (Flask, Response, g, render_template, jsonify, request, session, redirect,
+                   url_for, send_from_directory, stream_with_context, has_request_context)
 from flask_cors import CORS
 from dotenv import load_dotenv
 
-load_dotenv()  # loads .env → OPENAI_API_KEY
+load_dotenv()  # loads .env → OPENAI_API_KEY; before the local modules below, which read their settings on import
+
+from event_log import (LOG_OUTCOMES, format_log_time, get_event_log, get_log_index,  # noqa: E402
+                       log_field, parse_log_time)
+from event_store import EVENTS_BACKEND, get_event_store, import_row, render_line  # noqa: E402
+from ivr_sessions import CallStateError, call_sessions  # noqa: E402
+import offline_ivr  # noqa: E402
 
 app = Flask(__name__)
 app.secret_key = "medfollow_ai_secret_2024"
 CORS(app)  # allow the static SPA to call our API routes
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-RESPONSES_FILE = os.path.join(BASE_DIR, "responses.txt")
+RESPONSES_FILE  = os.path.join(BASE_DIR, "responses.txt")
+responses_log   = get_event_log(RESPONSES_FILE)
+responses_index = get_log_index(RESPONSES_FILE)
+event_store     = get_event_store()
+if EVENTS_BACKEND == "sqlite" and os.path.exists(RESPONSES_FILE):
+    event_store.import_log(RESPONSES_FILE)   # bring over lines written before the store (or by text-backend IVRs)
 
 
 # ─────────────────────────────────────────────
@@ -280,6 +305,581 @@ def get_t():
     return TRANSLATIONS.get(lang, TRANSLATIONS["English"])
 
 
+# ─────────────────────────────────────────────
+#  Metrics (Prometheus text format)
+# ─────────────────────────────────────────────
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_text(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    """Minimal labelled metric; one lock-protected dict of series per metric."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name      = name
+        self.help_text = help_text
+        self.labels    = tuple(labels)
+        self._series   = {}
+        self._lock     = threading.Lock()
+        METRICS.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for values, value in series:
+            lines.append(f"{self.name}{_label_text(self.labels, values)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *values, amount: float = 1):
+        with self._lock:
+            self._series[values] = self._series.get(values, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *values, amount: float = 1):
+        with self._lock:
+            self._series[values] = self._series.get(values, 0) + amount
+
+    def dec(self, *values):
+        self.inc(*values, amount=-1)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *values, value: float):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        names = self.labels + ("le",)
+        for values, (counts, total, count) in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_label_text(names, values + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, values)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, values)} {count}")
+        return lines
+
+
+METRICS = []
+
+http_requests = Counter("medfollow_http_requests_total",
+                        "HTTP requests by route and status.", ("method", "route", "status"))
+http_latency  = Histogram("medfollow_http_request_duration_seconds",
+                          "HTTP request latency by route.", ("method", "route"))
+http_in_flight = Gauge("medfollow_http_requests_in_flight",
+                       "HTTP requests currently being served.", ("route",))
+llm_upstream_latency = Histogram("medfollow_llm_upstream_duration_seconds",
+                                 "OpenAI call duration by outcome.", ("mode", "outcome"))
+chat_answers = Counter("medfollow_chat_answers_total",
+                       "Chat answers by source (llm, cache, fallback).", ("source",))
+vitals_stream_events = Counter("medfollow_vitals_stream_events_total",
+                               "Bedside stream samples and alerts by kind.", ("kind",))
+
+
+@app.before_request
+def _metrics_start():
+    g.metrics_route  = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    g.metrics_start  = time.perf_counter()
+    g.metrics_status = 500
+    http_in_flight.inc(g.metrics_route)
+
+
+@app.after_request
+def _metrics_status(response):
+    g.metrics_status = response.status_code
+    if response.is_streamed and "metrics_start" in g:
+        # Streamed bodies (SSE) are timed until the server closes them
+        args = (request.method, g.metrics_route, response.status_code, g.pop("metrics_start"))
+        response.call_on_close(lambda: _metrics_record(*args))
+    return response
+
+
+@app.teardown_request
+def _metrics_finish(exc):
+    start = g.pop("metrics_start", None)
+    if start is not None:
+        _metrics_record(request.method, g.metrics_route, g.metrics_status, start)
+
+
+def _metrics_record(method: str, route: str, status: int, start: float):
+    http_latency.observe(method, route, value=time.perf_counter() - start)
+    http_requests.inc(method, route, str(status))
+    http_in_flight.dec(route)
+
+
+# ─────────────────────────────────────────────
+#  LLM Response Cache (LRU + TTL)
+# ─────────────────────────────────────────────
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_MAX_BYTES   = int(os.getenv("LLM_CACHE_MAX_BYTES", str(1024 * 1024)))
+LLM_CACHE_TTL         = float(os.getenv("LLM_CACHE_TTL", "3600"))
+# Emergency answers are never cached unless explicitly enabled
+LLM_CACHE_EMERGENCY   = os.getenv("LLM_CACHE_EMERGENCY", "0") == "1"
+
+EMERGENCY_MARKERS = ["🚨", "call 108"]
+
+_NORMALIZE_TABLE = str.maketrans({c: " " for c in string.punctuation + "।॥¿¡"})
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry TTL and a total byte-size cap."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.ttl         = ttl
+        self._entries    = OrderedDict()   # key → (expires_at, value, size)
+        self._bytes      = 0
+        self._lock       = threading.Lock()
+        self.hits        = 0
+        self.misses      = 0
+        self.evictions   = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, size = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value: str):
+        size = len(value.encode("utf-8")) + len(repr(key).encode("utf-8"))
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries":     len(self._entries),
+                "bytes":       self._bytes,
+                "hits":        self.hits,
+                "misses":      self.misses,
+                "evictions":   self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+llm_cache = ResponseCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL)
+
+
+def normalize_message(message: str) -> str:
+    """Lower-case, strip punctuation and collapse whitespace for cache keys."""
+    return " ".join(message.lower().translate(_NORMALIZE_TABLE).split())
+
+
+def llm_cache_key(message: str, surgery_type: str, language: str) -> tuple:
+    """Cache and coalescing key for a first-turn reply. Shared replies are
+    requested without the patient's name (see llm_reply()), so the key is
+    everything else build_system_prompt() sends.
+    """
+    return (normalize_message(message), surgery_type, language)
+
+
+def is_emergency_reply(text: str) -> bool:
+    lowered = text.lower()
+    return any(marker in lowered for marker in EMERGENCY_MARKERS)
+
+
+def cacheable_reply(text: str) -> bool:
+    return LLM_CACHE_EMERGENCY or not is_emergency_reply(text)
+
+
+# ─────────────────────────────────────────────
+#  LLM Admission Control
+# ─────────────────────────────────────────────
+
+LLM_WORKERS          = int(os.getenv("LLM_WORKERS", "8"))
+LLM_QUEUE_DEPTH      = int(os.getenv("LLM_QUEUE_DEPTH", "16"))
+# "fallback" answers from keywords when saturated; "reject" returns 503
+LLM_SATURATED_POLICY = os.getenv("LLM_SATURATED_POLICY", "fallback")
+LLM_RETRY_AFTER      = int(os.getenv("LLM_RETRY_AFTER", "5"))
+
+
+class LLMSaturated(Exception):
+    """Raised when every LLM slot is taken and the policy is 'reject'."""
+
+
+class LLMGate:
+    """Dedicated bounded executor for OpenAI calls.
+    At most `workers` calls run at once and at most `queue_depth` more may
+    wait; anything beyond that is refused immediately, so slow upstream
+    calls can never pin every Flask worker thread.
+    """
+
+    def __init__(self, workers: int, queue_depth: int):
+        self.workers     = workers
+        self.queue_depth = queue_depth
+        self._executor   = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+        self._slots      = threading.BoundedSemaphore(workers + queue_depth)
+        self._lock       = threading.Lock()
+        self.in_use      = 0
+        self.rejected    = 0
+
+    def try_acquire(self) -> bool:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.in_use += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn on the LLM executor; returns a Future, or None if saturated."""
+        if not self.try_acquire():
+            return None
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers":     self.workers,
+                "queue_depth": self.queue_depth,
+                "in_use":      self.in_use,
+                "rejected":    self.rejected,
+            }
+
+
+llm_gate = LLMGate(LLM_WORKERS, LLM_QUEUE_DEPTH)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one upstream call.
+    The first caller (the leader) runs fn; callers arriving while it is in
+    flight wait on the same Future and receive its result or exception.
+    """
+
+    def __init__(self):
+        self._lock      = threading.Lock()
+        self._calls     = {}   # key → Future
+        self.leaders    = 0
+        self.coalesced  = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders":   self.leaders,
+                "coalesced": self.coalesced,
+            }
+
+
+llm_flights = SingleFlight()
+
+
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN  = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LLM_BREAKER_PROBES    = int(os.getenv("LLM_BREAKER_PROBES", "1"))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for the OpenAI endpoint.
+    closed    → calls pass; `threshold` failures in a row open the circuit
+    open      → calls are refused (instant fallback) for `cooldown` seconds
+    half_open → up to `probes` trial calls; a success closes the circuit,
+                a failure re-opens it
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int, cooldown: float, probes: int):
+        self.threshold       = threshold
+        self.cooldown        = cooldown
+        self.probes          = probes
+        self.state           = self.CLOSED
+        self.failures        = 0
+        self.opened_at       = 0.0
+        self.trips           = 0
+        self.short_circuited = 0
+        self._probing        = 0
+        self._lock           = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    self.short_circuited += 1
+                    return False
+                self.state    = self.HALF_OPEN
+                self._probing = 0
+            if self.state == self.HALF_OPEN:
+                if self._probing >= self.probes:
+                    self.short_circuited += 1
+                    return False
+                self._probing += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state == self.HALF_OPEN:
+                self.state    = self.CLOSED
+                self._probing = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED
+                                                and self.failures >= self.threshold):
+                self.state     = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing  = 0
+                self.trips    += 1
+
+    def cancel(self):
+        """Give back an allowed call that never reached the upstream."""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probing:
+                self._probing -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            return {
+                "state":           self.state,
+                "failures":        self.failures,
+                "trips":           self.trips,
+                "short_circuited": self.short_circuited,
+                "retry_in":        round(retry_in, 1),
+            }
+
+
+llm_breaker = CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN, LLM_BREAKER_PROBES)
+
+
+def llm_busy_response():
+    """503 returned by LLM-backed routes when LLMSaturated is raised."""
+    resp = jsonify({"error": "The AI assistant is busy. Please try again shortly."})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(LLM_RETRY_AFTER)
+    return resp
+
+
+# ─────────────────────────────────────────────
+#  Conversation Memory (server-side, token-budgeted)
+# ─────────────────────────────────────────────
+
+CONVERSATION_TOKEN_BUDGET  = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "800"))
+CONVERSATION_MAX_TURNS     = int(os.getenv("CONVERSATION_MAX_TURNS", "12"))
+CONVERSATION_SUMMARY_CHARS = int(os.getenv("CONVERSATION_SUMMARY_CHARS", "400"))
+CONVERSATION_MAX_ACTIVE    = int(os.getenv("CONVERSATION_MAX_ACTIVE", "2000"))
+CONVERSATION_IDLE_TTL      = float(os.getenv("CONVERSATION_IDLE_TTL", str(6 * 3600)))
+
+# Fallback intents that say nothing about the patient's condition
+SMALL_TALK_INTENTS = {"greeting", "how_are_you", "who_are_you", "help", "thanks", "ok"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 UTF-8 bytes per token; errs high for Indic scripts)."""
+    return len(text.encode("utf-8")) // 4 + 1
+
+
+class Conversation:
+    __slots__ = ("turns", "tokens", "topics", "notes", "touched")
+
+    def __init__(self):
+        self.turns   = deque()   # (role, content, tokens)
+        self.tokens  = 0
+        self.topics  = []        # symptom intents mentioned in folded turns
+        self.notes   = deque(maxlen=3)
+        self.touched = time.monotonic()
+
+
+class ConversationStore:
+    """Per-patient chat history kept on the server, not in the cookie.
+    Recent turns are kept verbatim up to a token budget; older turns are
+    folded into a short summary (topics + snippets), so the prompt sent
+    with each message stays bounded however long the conversation runs.
+    """
+
+    def __init__(self, token_budget: int, max_turns: int, summary_chars: int,
+                 max_active: int, idle_ttl: float):
+        self.token_budget  = token_budget
+        self.max_turns     = max_turns
+        self.summary_chars = summary_chars
+        self.max_active    = max_active
+        self.idle_ttl      = idle_ttl
+        self._convs        = OrderedDict()   # id → Conversation, least recent first
+        self._lock         = threading.Lock()
+
+    def history(self, conversation_id: str) -> list:
+        """Chat messages to send before the next user message."""
+        with self._lock:
+            conv = self._convs.get(conversation_id)
+            if conv is None:
+                return []
+            messages = []
+            summary = self._summary(conv)
+            if summary:
+                messages.append({"role": "system", "content": summary})
+            messages.extend({"role": role, "content": content} for role, content, _ in conv.turns)
+            return messages
+
+    def record(self, conversation_id: str, user_message: str, reply: str):
+        with self._lock:
+            now  = time.monotonic()
+            conv = self._convs.pop(conversation_id, None) or Conversation()
+            conv.touched = now
+            self._convs[conversation_id] = conv
+
+            for role, content in (("user", user_message), ("assistant", reply)):
+                tokens = estimate_tokens(content)
+                conv.turns.append((role, content, tokens))
+                conv.tokens += tokens
+            while conv.turns and (conv.tokens > self.token_budget
+                                  or len(conv.turns) > self.max_turns):
+                self._fold_oldest(conv)
+
+            # Drop idle conversations, then the least recently used beyond the cap
+            while self._convs:
+                oldest_id, oldest = next(iter(self._convs.items()))
+                if now - oldest.touched <= self.idle_ttl and len(self._convs) <= self.max_active:
+                    break
+                del self._convs[oldest_id]
+
+    def forget(self, conversation_id: str):
+        with self._lock:
+            self._convs.pop(conversation_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"active": len(self._convs)}
+
+    def _fold_oldest(self, conv: Conversation):
+        role, content, tokens = conv.turns.popleft()
+        conv.tokens -= tokens
+        if role != "user":
+            return
+        idx = fallback_matcher.match(content.lower().strip())
+        topic = fallback_matcher.names[idx] if idx is not None else None
+        if topic and topic not in SMALL_TALK_INTENTS:
+            if topic in conv.topics:
+                conv.topics.remove(topic)
+            conv.topics.append(topic)
+            del conv.topics[:-8]
+        snippet = " ".join(content.split())
+        conv.notes.append(snippet[:80] + ("…" if len(snippet) > 80 else ""))
+
+    def _summary(self, conv: Conversation) -> str:
+        if not conv.topics and not conv.notes:
+            return ""
+        summary = "Summary of earlier messages in this conversation:"
+        if conv.topics:
+            summary += " topics discussed — " + ", ".join(t.replace("_", " ") for t in conv.topics) + "."
+        if conv.notes:
+            summary += " Patient said: " + "; ".join(f'"{n}"' for n in conv.notes) + "."
+        return summary[:self.summary_chars]
+
+
+conversations = ConversationStore(CONVERSATION_TOKEN_BUDGET, CONVERSATION_MAX_TURNS,
+                                  CONVERSATION_SUMMARY_CHARS, CONVERSATION_MAX_ACTIVE,
+                                  CONVERSATION_IDLE_TTL)
+
+
+def conversation_key(patient_name: str) -> str:
+    """Server-side conversation id for this browser session and patient.
+    Only the id lives in the cookie; a new patient starts a new conversation.
+    """
+    if session.get("conversation_patient") != patient_name or "conversation_id" not in session:
+        session["conversation_id"]      = uuid.uuid4().hex
+        session["conversation_patient"] = patient_name
+    return session["conversation_id"]
+
+
 # ─────────────────────────────────────────────
 #  OpenAI GPT — Medical AI Chatbot
 # ─────────────────────────────────────────────
@@ -303,320 +903,1349 @@ Language: ALWAYS reply in the EXACT SAME LANGUAGE the patient writes in.
 Safety: Never suggest stopping prescribed medications. Always err on the side of caution."""
 
 
-def ask_llm(message: str) -> str:
+# Client tuning — all overridable from .env
+LLM_MODEL           = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT    = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE   = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+LLM_MAX_RETRIES     = int(os.getenv("LLM_MAX_RETRIES", "1"))
+
+_llm_client = None
+_llm_client_key = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client(api_key: str):
+    """Return the process-wide OpenAI client, building it on first use.
+    The client owns a pooled httpx transport, so keep-alive connections are
+    reused across chat turns instead of paying a new handshake every time.
+    It is rebuilt only if the API key changes.
+    """
+    global _llm_client, _llm_client_key
+    client = _llm_client
+    if client is not None and _llm_client_key == api_key:
+        return client
+
+    with _llm_client_lock:
+        if _llm_client is None or _llm_client_key != api_key:
+            import httpx
+            from openai import OpenAI
+
+            http_client = httpx.Client(
+                timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                    max_keepalive_connections=LLM_MAX_KEEPALIVE),
+            )
+            if _llm_client is not None:
+                _llm_client.close()
+            # base_url is picked up from OPENAI_BASE_URL when set
+            _llm_client = OpenAI(api_key=api_key, http_client=http_client,
+                                 max_retries=LLM_MAX_RETRIES)
+            _llm_client_key = api_key
+        return _llm_client
+
+
+def build_system_prompt(patient_name: str, surgery_type: str, language: str) -> str:
+    """Append the patient context lines to SYSTEM_PROMPT."""
+    context_lines = []
+    if patient_name:
+        context_lines.append(f"Patient name: {patient_name}")
+    if surgery_type:
+        context_lines.append(f"Surgery/procedure: {surgery_type}")
+    if language:
+        context_lines.append(f"Preferred language: {language} (reply in this language)")
+
+    system = SYSTEM_PROMPT
+    if context_lines:
+        system += "\n\nPatient context:\n" + "\n".join(context_lines)
+    return system
+
+
+def llm_request(message: str, patient_name: str, surgery_type: str, language: str,
+                history: list = None) -> dict:
+    """Keyword arguments for client.chat.completions.create()."""
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system",  "content": build_system_prompt(patient_name, surgery_type, language)},
+            *(history or []),
+            {"role": "user",    "content": message},
+        ],
+        "max_tokens": 300,
+        "temperature": 0.5,
+    }
+
+
+def ask_llm(message: str, patient_name: str = None, surgery_type: str = None,
+            language: str = None, conversation_id: str = None) -> str:
     """Call GPT-4o-mini with a hospital assistant system prompt.
     Falls back to keyword-based response if API key is missing or request fails.
+    Patient context not passed explicitly is taken from the session. With a
+    conversation_id, earlier turns are sent along and this turn is recorded.
+    Raises LLMSaturated when the LLM executor is full and the policy is 'reject'.
     """
     api_key = os.getenv("OPENAI_API_KEY", "").strip()
 
+    # Include patient context from session if available (never on worker threads)
+    context = session if has_request_context() else {}
+    if patient_name is None:
+        patient_name = context.get("patient_name", "")
+    if surgery_type is None:
+        surgery_type = context.get("surgery_type", "")
+    if language is None:
+        language = context.get("language", "English")
+    history = conversations.history(conversation_id) if conversation_id else None
+
+    reply = None
     if api_key:
+        reply = llm_reply(api_key, message, patient_name, surgery_type, language, history)
+    if reply is None:
+        chat_answers.inc("fallback")
+        reply = fallback_reply(message, patient_name)
+
+    if conversation_id:
+        conversations.record(conversation_id, message, reply)
+    return reply
+
+
+def timed_completion(client, **kwargs):
+    """client.chat.completions.create(), recording upstream latency."""
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(**kwargs)
+    except Exception:
+        llm_upstream_latency.observe("blocking", "error", value=time.perf_counter() - start)
+        raise
+    llm_upstream_latency.observe("blocking", "ok", value=time.perf_counter() - start)
+    return response
+
+
+def llm_reply(api_key: str, message: str, patient_name: str, surgery_type: str,
+              language: str, history: list = None):
+    """Upstream half of ask_llm(): cache, then a coalesced, breaker-guarded
+    OpenAI call. Returns None when the keyword fallback should answer.
+    First turns are shared across patients, so their prompt leaves out the
+    patient's name; follow-ups depend on the conversation and bypass both.
+    """
+    cache_key = None if history else llm_cache_key(message, surgery_type, language)
+    prompt_name = patient_name if history else ""
+    if cache_key is not None:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            chat_answers.inc("cache")
+            return cached
+
+    def fetch():
+        if not llm_breaker.allow():
+            return None   # circuit open — straight to the fallback
+        client = get_llm_client(api_key)
+        future = llm_gate.submit(timed_completion, client,
+                                 **llm_request(message, prompt_name, surgery_type, language, history))
+        if future is None:
+            llm_breaker.cancel()
+            if LLM_SATURATED_POLICY == "reject":
+                raise LLMSaturated()
+            print("[WARN] LLM capacity exhausted — using keyword fallback")
+            return None
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=api_key)
-
-            # Include patient context from session if available
-            patient_name  = session.get("patient_name", "")
-            surgery_type  = session.get("surgery_type", "")
-            language      = session.get("language", "English")
-
-            context_lines = []
-            if patient_name:
-                context_lines.append(f"Patient name: {patient_name}")
-            if surgery_type:
-                context_lines.append(f"Surgery/procedure: {surgery_type}")
-            if language:
-                context_lines.append(f"Preferred language: {language} (reply in this language)")
-
-            system = SYSTEM_PROMPT
-            if context_lines:
-                system += "\n\nPatient context:\n" + "\n".join(context_lines)
-
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system",  "content": system},
-                    {"role": "user",    "content": message},
-                ],
-                max_tokens=300,
-                temperature=0.5,
-            )
-            return response.choices[0].message.content.strip()
+            reply = future.result().choices[0].message.content.strip()
+        except Exception:
+            llm_breaker.record_failure()
+            raise
+        llm_breaker.record_success()
+        chat_answers.inc("llm")
+        if cache_key is not None and cacheable_reply(reply):
+            llm_cache.put(cache_key, reply)
+        return reply
 
-        except Exception as e:
-            # Log and fall through to keyword fallback
-            print(f"[WARN] OpenAI API error: {e}")
+    try:
+        if cache_key is None:
+            return fetch()
+        # Identical questions already in flight share one upstream call
+        return llm_flights.do(cache_key, fetch)
+
+    except LLMSaturated:
+        raise
+    except Exception as e:
+        # Log and fall through to keyword fallback
+        print(f"[WARN] OpenAI API error: {e}")
+        return None
+
+
+def ask_llm_stream(message: str, conversation_id: str = None):
+    """Streaming variant of ask_llm(): yields the reply in chunks.
+    Tokens are forwarded as the OpenAI stream produces them; cache hits and
+    the keyword fallback are yielded line by line so the first byte is
+    always immediate. The stream holds an LLM slot while it is read and
+    always falls back when none is free.
+    """
+    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+
+    patient_name  = session.get("patient_name", "")
+    surgery_type  = session.get("surgery_type", "")
+    language      = session.get("language", "English")
+    history = conversations.history(conversation_id) if conversation_id else None
+
+    parts = []
+    for delta in llm_stream_chunks(api_key, message, patient_name, surgery_type, language, history):
+        parts.append(delta)
+        yield delta
+
+    if conversation_id:
+        conversations.record(conversation_id, message, "".join(parts).strip())
 
-    # ── Smart Conversational Fallback ─────────────────────────────────
-    msg = message.lower().strip()
-    name = session.get("patient_name", "")
-    greeting_name = f", {name}" if name else ""
 
+def llm_stream_chunks(api_key: str, message: str, patient_name: str, surgery_type: str,
+                      language: str, history: list = None):
+    """Chunk source behind ask_llm_stream(): cache, streamed GPT, or keyword fallback."""
+    if api_key:
+        cache_key = None if history else llm_cache_key(message, surgery_type, language)
+        prompt_name = patient_name if history else ""     # shared first turns: see llm_reply()
+        cached = llm_cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            chat_answers.inc("cache")
+            yield from cached.splitlines(keepends=True)
+            return
+
+        parts = []
+        if not llm_breaker.allow():
+            pass   # circuit open — straight to the fallback
+        elif not llm_gate.try_acquire():
+            llm_breaker.cancel()
+            print("[WARN] LLM capacity exhausted — using keyword fallback")
+        else:
+            settled = False
+            start   = time.perf_counter()
+            try:
+                client = get_llm_client(api_key)
+                stream = client.chat.completions.create(
+                    stream=True,
+                    **llm_request(message, prompt_name, surgery_type, language, history))
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+                llm_breaker.record_success()
+                llm_upstream_latency.observe("stream", "ok", value=time.perf_counter() - start)
+                settled = True
+                reply = "".join(parts).strip()
+                if reply:
+                    chat_answers.inc("llm")
+                    if cache_key is not None and cacheable_reply(reply):
+                        llm_cache.put(cache_key, reply)
+                    return
+
+            except Exception as e:
+                llm_breaker.record_failure()
+                llm_upstream_latency.observe("stream", "error", value=time.perf_counter() - start)
+                settled = True
+                print(f"[WARN] OpenAI API error: {e}")
+                if parts:
+                    # Part of the answer is already on the wire — don't splice in a second one
+                    return
+            finally:
+                if not settled:
+                    llm_breaker.cancel()   # client went away mid-stream
+                llm_gate.release()
+
+    chat_answers.inc("fallback")
+    yield from fallback_reply(message, patient_name).splitlines(keepends=True)
+
+
+# ─────────────────────────────────────────────
+#  Keyword Fallback — compiled intent matcher
+# ─────────────────────────────────────────────
+
+MATCH_PREFIX   = "prefix"     # whole message, or its leading word(s)
+MATCH_CONTAINS = "contains"   # substring anywhere in the message
+MATCH_EXACT    = "exact"      # whole message only
+
+# (intent, match kind, keywords, reply template) — earlier entries win
+FALLBACK_INTENTS = [
     # Greetings
-    greetings = ["hi", "hello", "hey", "hii", "helo", "howdy", "namaste",
-                 "नमस्ते", "నమస్కారం", "good morning", "good evening",
-                 "good afternoon", "good night", "sup", "yo"]
-    if any(msg == g or msg.startswith(g + " ") for g in greetings):
-        return (
-            f"Hello{greeting_name}! 👋 I'm MedFollow AI, your personal health assistant. "
-            "I'm here to help you with any symptoms, recovery questions, or medication concerns. "
-            "How are you feeling today? Please describe what's going on and I'll guide you."
-        )
+    ("greeting", MATCH_PREFIX,
+     ["hi", "hello", "hey", "hii", "helo", "howdy", "namaste", "नमस्ते", "నమస్కారం",
+      "good morning", "good evening", "good afternoon", "good night", "sup", "yo"],
+     "Hello{greeting_name}! 👋 I'm MedFollow AI, your personal health assistant. "
+     "I'm here to help you with any symptoms, recovery questions, or medication concerns. "
+     "How are you feeling today? Please describe what's going on and I'll guide you."),
 
     # How are you
-    if any(p in msg for p in ["how are you", "how r u", "are you ok", "kaise ho", "ela unnav"]):
-        return (
-            f"I'm doing great, thank you{greeting_name}! 😊 More importantly — how are YOU feeling? "
-            "Tell me about any symptoms or concerns and I'll provide guidance right away."
-        )
+    ("how_are_you", MATCH_CONTAINS,
+     ["how are you", "how r u", "are you ok", "kaise ho", "ela unnav"],
+     "I'm doing great, thank you{greeting_name}! 😊 More importantly — how are YOU feeling? "
+     "Tell me about any symptoms or concerns and I'll provide guidance right away."),
 
     # Who are you / what can you do
-    if any(p in msg for p in ["who are you", "what are you", "what can you do",
-                               "tell me about yourself", "aap kaun"]):
-        return (
-            "I'm MedFollow AI 🏥 — your hospital follow-up health assistant. I can help with:\n"
-            "• Post-surgery recovery questions\n"
-            "• Symptom assessment (fever, pain, swelling, etc.)\n"
-            "• Medication and wound care guidance\n"
-            "• Vital sign interpretation\n\n"
-            "Just describe your symptoms and I'll give you personalised guidance!"
-        )
+    ("who_are_you", MATCH_CONTAINS,
+     ["who are you", "what are you", "what can you do", "tell me about yourself",
+      "aap kaun"],
+     "I'm MedFollow AI 🏥 — your hospital follow-up health assistant. I can help with:\n"
+     "• Post-surgery recovery questions\n"
+     "• Symptom assessment (fever, pain, swelling, etc.)\n"
+     "• Medication and wound care guidance\n"
+     "• Vital sign interpretation\n\n"
+     "Just describe your symptoms and I'll give you personalised guidance!"),
 
     # Help / menu
-    if any(p in msg for p in ["help", "options", "menu", "help me", "सहायता", "సహాయం"]):
-        return (
-            "Sure! Here's what you can ask me about:\n\n"
-            "🌡️ Fever / Temperature\n"
-            "💊 Pain or Discomfort\n"
-            "💓 Blood Pressure / Heart Rate\n"
-            "🩸 Blood Sugar / Diabetes\n"
-            "😮‍💨 Breathing Difficulty\n"
-            "🤢 Nausea / Dizziness\n"
-            "🩹 Wound / Incision Care\n"
-            "💤 Fatigue / Sleep Issues\n"
-            "💉 Medication Questions\n\n"
-            "Just type your symptom and I'll guide you!"
-        )
+    ("help", MATCH_CONTAINS,
+     ["help", "options", "menu", "help me", "सहायता", "సహాయం"],
+     "Sure! Here's what you can ask me about:\n\n"
+     "🌡️ Fever / Temperature\n"
+     "💊 Pain or Discomfort\n"
+     "💓 Blood Pressure / Heart Rate\n"
+     "🩸 Blood Sugar / Diabetes\n"
+     "😮‍💨 Breathing Difficulty\n"
+     "🤢 Nausea / Dizziness\n"
+     "🩹 Wound / Incision Care\n"
+     "💤 Fatigue / Sleep Issues\n"
+     "💉 Medication Questions\n\n"
+     "Just type your symptom and I'll guide you!"),
 
     # Thank you
-    if any(p in msg for p in ["thank", "thanks", "thank you", "ty", "dhanyavad",
-                               "ధన్యవాదాలు", "धन्यवाद"]):
-        return (
-            f"You're very welcome{greeting_name}! 😊 "
-            "If anything feels urgent, don't hesitate to call 108 or contact your doctor directly. "
-            "Take good care and feel better soon!"
-        )
+    ("thanks", MATCH_CONTAINS,
+     ["thank", "thanks", "thank you", "ty", "dhanyavad", "ధన్యవాదాలు", "धन्यवाद"],
+     "You're very welcome{greeting_name}! 😊 "
+     "If anything feels urgent, don't hesitate to call 108 or contact your doctor directly. "
+     "Take good care and feel better soon!"),
 
     # OK / fine
-    if msg in ["ok", "okay", "fine", "alright", "got it", "understood", "k", "sure"]:
-        return (
-            "Glad to hear that! 😊 Feel free to ask me anything else. "
-            "If new symptoms appear or anything changes, just let me know."
-        )
+    ("ok", MATCH_EXACT,
+     ["ok", "okay", "fine", "alright", "got it", "understood", "k", "sure"],
+     "Glad to hear that! 😊 Feel free to ask me anything else. "
+     "If new symptoms appear or anything changes, just let me know."),
 
     # Fever
-    if any(w in msg for w in ["fever", "temperature", "hot", "burning", "chills",
-                               "बुखार", "तापमान", "జ్వరం", "ఉష్ణోగ్రత"]):
-        return (
-            "🌡️ A fever can be your body fighting infection. Here's what to do:\n\n"
-            "• Stay well hydrated — drink water, ORS, or coconut water every hour\n"
-            "• Rest completely; avoid physical exertion\n"
-            "• Take paracetamol (as prescribed) to bring it down\n"
-            "• Apply a cool damp cloth on your forehead\n\n"
-            "⚠️ Call your doctor immediately if: temperature exceeds 103°F (39.4°C), "
-            "fever lasts more than 48 hours, or is accompanied by severe headache or rash."
-        )
+    ("fever", MATCH_CONTAINS,
+     ["fever", "temperature", "hot", "burning", "chills", "बुखार", "तापमान", "జ్వరం",
+      "ఉష్ణోగ్రత"],
+     "🌡️ A fever can be your body fighting infection. Here's what to do:\n\n"
+     "• Stay well hydrated — drink water, ORS, or coconut water every hour\n"
+     "• Rest completely; avoid physical exertion\n"
+     "• Take paracetamol (as prescribed) to bring it down\n"
+     "• Apply a cool damp cloth on your forehead\n\n"
+     "⚠️ Call your doctor immediately if: temperature exceeds 103°F (39.4°C), "
+     "fever lasts more than 48 hours, or is accompanied by severe headache or rash."),
 
     # Pain
-    if any(w in msg for w in ["pain", "ache", "hurt", "sore", "cramp",
-                               "दर्द", "నొప్పి"]):
-        return (
-            "💊 Pain management after surgery or illness:\n\n"
-            "• Note the location and rate your pain (1 = mild, 10 = severe)\n"
-            "• Take your prescribed pain medication on schedule, don't skip doses\n"
-            "• Apply a warm compress for muscle aches, cold pack for swelling\n\n"
-            "⚠️ Seek care immediately if: pain is sudden and severe (8–10/10), "
-            "pain is spreading, or accompanied by fever or swelling."
-        )
+    ("pain", MATCH_CONTAINS,
+     ["pain", "ache", "hurt", "sore", "cramp", "दर्द", "నొప్పి"],
+     "💊 Pain management after surgery or illness:\n\n"
+     "• Note the location and rate your pain (1 = mild, 10 = severe)\n"
+     "• Take your prescribed pain medication on schedule, don't skip doses\n"
+     "• Apply a warm compress for muscle aches, cold pack for swelling\n\n"
+     "⚠️ Seek care immediately if: pain is sudden and severe (8–10/10), "
+     "pain is spreading, or accompanied by fever or swelling."),
 
     # Breathing
-    if any(w in msg for w in ["breathe", "breathing", "breath", "shortness",
-                               "oxygen", "chest", "सांस", "ఊపిరి"]):
-        return (
-            "😮‍💨 Breathing difficulty needs immediate attention:\n\n"
-            "• Sit upright — don't lie flat\n"
-            "• Breathe in slowly through your nose, out through your mouth\n"
-            "• Loosen any tight clothing around your chest\n\n"
-            "🚨 Call 108 immediately if: SpO₂ drops below 94%, "
-            "you feel chest tightness, or you cannot speak full sentences."
-        )
+    ("breathing", MATCH_CONTAINS,
+     ["breathe", "breathing", "breath", "shortness", "oxygen", "chest", "सांस", "ఊపిరి"],
+     "😮‍💨 Breathing difficulty needs immediate attention:\n\n"
+     "• Sit upright — don't lie flat\n"
+     "• Breathe in slowly through your nose, out through your mouth\n"
+     "• Loosen any tight clothing around your chest\n\n"
+     "🚨 Call 108 immediately if: SpO₂ drops below 94%, "
+     "you feel chest tightness, or you cannot speak full sentences."),
 
     # Dizziness / Nausea
-    if any(w in msg for w in ["dizzy", "dizziness", "faint", "nausea", "nauseous",
-                               "vomit", "vomiting", "lightheaded", "चक्कर", "మైకం"]):
-        return (
-            "🤢 Dizziness or nausea is common after surgery or medication changes:\n\n"
-            "• Sit or lie down immediately to prevent a fall\n"
-            "• Sip cold water slowly — small sips, not large gulps\n"
-            "• Avoid sudden head movements or standing up too quickly\n"
-            "• Eat small, bland meals (rice, toast, bananas)\n\n"
-            "⚠️ See your doctor if: nausea persists over 6 hours or you cannot keep fluids down."
-        )
+    ("dizziness", MATCH_CONTAINS,
+     ["dizzy", "dizziness", "faint", "nausea", "nauseous", "vomit", "vomiting",
+      "lightheaded", "चक्कर", "మైకం"],
+     "🤢 Dizziness or nausea is common after surgery or medication changes:\n\n"
+     "• Sit or lie down immediately to prevent a fall\n"
+     "• Sip cold water slowly — small sips, not large gulps\n"
+     "• Avoid sudden head movements or standing up too quickly\n"
+     "• Eat small, bland meals (rice, toast, bananas)\n\n"
+     "⚠️ See your doctor if: nausea persists over 6 hours or you cannot keep fluids down."),
 
     # Swelling
-    if any(w in msg for w in ["swelling", "swollen", "puffiness", "edema",
-                               "सूजन", "వాపు"]):
-        return (
-            "🦵 Post-surgical swelling management:\n\n"
-            "• Elevate the swollen area above heart level when resting\n"
-            "• Apply an ice pack wrapped in cloth: 20 min on, 20 min off\n"
-            "• Reduce salt intake to prevent fluid retention\n\n"
-            "⚠️ See your doctor today if: swelling is red, warm, or spreading — "
-            "this may indicate infection or a blood clot."
-        )
+    ("swelling", MATCH_CONTAINS,
+     ["swelling", "swollen", "puffiness", "edema", "सूजन", "వాపు"],
+     "🦵 Post-surgical swelling management:\n\n"
+     "• Elevate the swollen area above heart level when resting\n"
+     "• Apply an ice pack wrapped in cloth: 20 min on, 20 min off\n"
+     "• Reduce salt intake to prevent fluid retention\n\n"
+     "⚠️ See your doctor today if: swelling is red, warm, or spreading — "
+     "this may indicate infection or a blood clot."),
 
     # Wound
-    if any(w in msg for w in ["wound", "incision", "cut", "stitches", "suture",
-                               "bleed", "bleeding", "pus", "घाव", "గాయం"]):
-        return (
-            "🩹 Wound care essentials:\n\n"
-            "• Keep the wound clean and dry at all times\n"
-            "• Change dressings on schedule; don't remove stitches yourself\n"
-            "• Do NOT use hydrogen peroxide unless prescribed\n\n"
-            "🚨 Go to your doctor immediately if: you notice increased redness, warmth, "
-            "swelling, foul odor, yellow/green discharge, or if bleeding won't stop."
-        )
+    ("wound", MATCH_CONTAINS,
+     ["wound", "incision", "cut", "stitches", "suture", "bleed", "bleeding", "pus",
+      "घाव", "గాయం"],
+     "🩹 Wound care essentials:\n\n"
+     "• Keep the wound clean and dry at all times\n"
+     "• Change dressings on schedule; don't remove stitches yourself\n"
+     "• Do NOT use hydrogen peroxide unless prescribed\n\n"
+     "🚨 Go to your doctor immediately if: you notice increased redness, warmth, "
+     "swelling, foul odor, yellow/green discharge, or if bleeding won't stop."),
 
     # Blood sugar
-    if any(w in msg for w in ["sugar", "glucose", "diabetes", "insulin",
-                               "शर्करा", "చక్కెర"]):
-        return (
-            "🩸 Blood sugar control during recovery:\n\n"
-            "• Continue your prescribed diabetes medications — do NOT stop them\n"
-            "• Eat regular small meals; avoid skipping meals\n"
-            "• Target fasting blood sugar: 80–130 mg/dL\n\n"
-            "⚠️ Low sugar (<70 mg/dL) → eat glucose tablets or 3 teaspoons of sugar in water RIGHT NOW. "
-            "High sugar (>250) → contact your doctor today."
-        )
+    ("blood_sugar", MATCH_CONTAINS,
+     ["sugar", "glucose", "diabetes", "insulin", "शर्करा", "చక్కెర"],
+     "🩸 Blood sugar control during recovery:\n\n"
+     "• Continue your prescribed diabetes medications — do NOT stop them\n"
+     "• Eat regular small meals; avoid skipping meals\n"
+     "• Target fasting blood sugar: 80–130 mg/dL\n\n"
+     "⚠️ Low sugar (<70 mg/dL) → eat glucose tablets or 3 teaspoons of sugar in water RIGHT NOW. "
+     "High sugar (>250) → contact your doctor today."),
 
     # Blood pressure
-    if any(w in msg for w in ["blood pressure", "bp", "hypertension", "hypotension",
-                               "pressure", "रक्तचाप", "రక్తపోటు"]):
-        return (
-            "💓 Blood pressure monitoring during recovery:\n\n"
-            "• Normal range: 90–120 / 60–80 mmHg\n"
-            "• Take your BP medications exactly as prescribed\n"
-            "• Reduce salt, processed foods, and caffeine\n\n"
-            "⚠️ Contact your doctor if BP is consistently above 140/90 or below 90/60. "
-            "Severe headache with high BP → emergency care."
-        )
+    ("blood_pressure", MATCH_CONTAINS,
+     ["blood pressure", "bp", "hypertension", "hypotension", "pressure", "रक्तचाप",
+      "రక్తపోటు"],
+     "💓 Blood pressure monitoring during recovery:\n\n"
+     "• Normal range: 90–120 / 60–80 mmHg\n"
+     "• Take your BP medications exactly as prescribed\n"
+     "• Reduce salt, processed foods, and caffeine\n\n"
+     "⚠️ Contact your doctor if BP is consistently above 140/90 or below 90/60. "
+     "Severe headache with high BP → emergency care."),
 
     # Fatigue / Sleep
-    if any(w in msg for w in ["tired", "fatigue", "weak", "weakness", "sleep",
-                               "insomnia", "exhausted", "थकान", "అలసట"]):
-        return (
-            "💤 Fatigue is very common after surgery or illness:\n\n"
-            "• Aim for 7–9 hours of sleep per night\n"
-            "• Take short, gentle walks to improve circulation\n"
-            "• Eat protein-rich foods (eggs, lentils, paneer) to support tissue repair\n"
-            "• Stay well hydrated\n\n"
-            "⚠️ See your doctor if weakness is getting worse or accompanied by chest pain."
-        )
+    ("fatigue", MATCH_CONTAINS,
+     ["tired", "fatigue", "weak", "weakness", "sleep", "insomnia", "exhausted", "थकान",
+      "అలసట"],
+     "💤 Fatigue is very common after surgery or illness:\n\n"
+     "• Aim for 7–9 hours of sleep per night\n"
+     "• Take short, gentle walks to improve circulation\n"
+     "• Eat protein-rich foods (eggs, lentils, paneer) to support tissue repair\n"
+     "• Stay well hydrated\n\n"
+     "⚠️ See your doctor if weakness is getting worse or accompanied by chest pain."),
 
     # Medication
-    if any(w in msg for w in ["medicine", "medication", "tablet", "pill", "drug",
-                               "dose", "antibiotic", "दवा", "మందు"]):
-        return (
-            "💊 Medication guidance:\n\n"
-            "• Take all medications exactly as prescribed — don't skip or double doses\n"
-            "• Complete the full antibiotic course even if you feel better\n"
-            "• Avoid alcohol during medication\n\n"
-            "⚠️ Stop and call your doctor if you notice: skin rash, difficulty breathing, "
-            "swollen lips/throat, or severe stomach pain."
-        )
-
-    # Catchall
-    return (
-        f"I'd love to help you{greeting_name}! 😊 "
-        "Could you describe your symptoms in a bit more detail?\n\n"
-        "• Where exactly is the discomfort?\n"
-        "• When did it start?\n"
-        "• How severe is it (mild / moderate / severe)?\n\n"
-        "You can also open the **Health Overview** page to log your vitals for a full AI analysis."
-    )
-
-
-def analyze_vitals(vitals: dict) -> str:
-    """Generate a health summary from submitted vitals."""
-    issues = []
-    recommendations = []
+    ("medication", MATCH_CONTAINS,
+     ["medicine", "medication", "tablet", "pill", "drug", "dose", "antibiotic", "दवा",
+      "మందు"],
+     "💊 Medication guidance:\n\n"
+     "• Take all medications exactly as prescribed — don't skip or double doses\n"
+     "• Complete the full antibiotic course even if you feel better\n"
+     "• Avoid alcohol during medication\n\n"
+     "⚠️ Stop and call your doctor if you notice: skin rash, difficulty breathing, "
+     "swollen lips/throat, or severe stomach pain."),
+]
+
+FALLBACK_CATCHALL = (
+    "I'd love to help you{greeting_name}! 😊 "
+    "Could you describe your symptoms in a bit more detail?\n\n"
+    "• Where exactly is the discomfort?\n"
+    "• When did it start?\n"
+    "• How severe is it (mild / moderate / severe)?\n\n"
+    "You can also open the **Health Overview** page to log your vitals for a full AI analysis."
+)
+
+
+def keyword_trie_pattern(keywords) -> str:
+    """Build a regex that matches any keyword, sharing common prefixes.
+    At each position the longest keyword is preferred.
+    """
+    trie = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+
+class IntentMatcher:
+    """Single-pass matcher compiled once from an ordered intent table.
+    All 'contains' keywords share one trie regex inside a lookahead, so one
+    finditer() scan sees every keyword occurrence; the lowest table index
+    wins, exactly as the old if-chain did. 'exact' intents are a dict
+    lookup and 'prefix' intents one anchored regex.
+    """
+
+    def __init__(self, intents):
+        self.names = [intent[0] for intent in intents]
+        exact, prefix, contains = {}, {}, {}
+        tables = {MATCH_EXACT: exact, MATCH_PREFIX: prefix, MATCH_CONTAINS: contains}
+        for idx, (_, kind, keywords, _) in enumerate(intents):
+            for kw in keywords:
+                tables[kind].setdefault(kw, idx)
+
+        # A regex hit on keyword k also implies a hit on every keyword that
+        # is a prefix of k, so k resolves to the best index among them.
+        self._exact    = exact
+        self._prefix   = prefix
+        self._contains = {kw: min(i for other, i in contains.items() if kw.startswith(other))
+                          for kw in contains}
+        self._floor    = min(self._contains.values(), default=None)
+        self._prefix_re = (re.compile("(" + keyword_trie_pattern(prefix) + r")(?: |\Z)")
+                           if prefix else None)
+        self._contains_re = (re.compile("(?=(" + keyword_trie_pattern(contains) + "))")
+                             if contains else None)
+
+    def match(self, msg: str):
+        """Return the index of the winning intent for a normalised message, or None."""
+        best = self._exact.get(msg)
+        if self._prefix_re is not None:
+            m = self._prefix_re.match(msg)
+            if m and (best is None or self._prefix[m.group(1)] < best):
+                best = self._prefix[m.group(1)]
+        if self._contains_re is not None and (best is None or best > self._floor):
+            for m in self._contains_re.finditer(msg):
+                idx = self._contains[m.group(1)]
+                if best is None or idx < best:
+                    best = idx
+                    if best <= self._floor:
+                        break
+        return best
+
+
+fallback_matcher = IntentMatcher(FALLBACK_INTENTS)
+
+
+def fallback_reply(message: str, name: str = "") -> str:
+    """Keyword-based reply used when the LLM is unavailable."""
+    greeting_name = f", {name}" if name else ""
+    idx = fallback_matcher.match(message.lower().strip())
+    template = FALLBACK_CATCHALL if idx is None else FALLBACK_INTENTS[idx][3]
+    return template.format(greeting_name=greeting_name)
+
+
+# ─────────────────────────────────────────────
+#  Vitals Analysis
+# ─────────────────────────────────────────────
+
+# Population defaults; a reading <= 0 (or unparseable) counts as not measured
+VITAL_THRESHOLDS = {
+    "temp_high":      99.5,   # °F
+    "temp_low":       96.0,
+    "systolic_high":  140,    # mmHg
+    "diastolic_high": 90,
+    "systolic_low":   90,
+    "diastolic_low":  60,
+    "hr_high":        100,    # bpm
+    "hr_low":         60,
+    "sugar_high":     180,    # mg/dL
+    "sugar_low":      70,
+    "spo2_low":       94,     # %
+}
+
+# Per-procedure overrides of VITAL_THRESHOLDS (keys match the surgery options)
+PROCEDURE_THRESHOLDS = {
+    # Tighter haemodynamic and oxygenation targets after heart surgery
+    "Cardiac Surgery":  {"systolic_high": 130, "diastolic_high": 80, "hr_high": 90, "spo2_low": 95},
+    # Minor outpatient procedure — only a clinical fever (100.4°F) is flagged
+    "Cataract Surgery": {"temp_high": 100.4},
+}
+
+# (issue code, vital, any-of conditions [(signal, op, threshold key)], issue text, recommendation)
+# Within one vital the first matching rule wins, so "high" rules come first.
+VITAL_RULES = [
+    ("temp_high", "temperature", [("temperature", ">", "temp_high")],
+     "Elevated temperature ({temperature}°F — possible fever)",
+     "Stay hydrated, rest, and monitor temperature every 4 hours."),
+    ("temp_low", "temperature", [("temperature", "<", "temp_low")],
+     "Low temperature ({temperature}°F — possible hypothermia risk)",
+     "Keep warm and consult your doctor."),
+    ("bp_high", "blood_pressure", [("systolic", ">", "systolic_high"), ("diastolic", ">", "diastolic_high")],
+     "High blood pressure ({blood_pressure} mmHg — hypertension range)",
+     "Reduce salt intake, limit stress, and consult your physician."),
+    ("bp_low", "blood_pressure", [("systolic", "<", "systolic_low"), ("diastolic", "<", "diastolic_low")],
+     "Low blood pressure ({blood_pressure} mmHg — hypotension range)",
+     "Increase fluid intake, rise slowly from sitting/lying positions."),
+    ("hr_high", "heart_rate", [("heart_rate", ">", "hr_high")],
+     "Elevated heart rate ({heart_rate} bpm — tachycardia)",
+     "Rest, avoid caffeine, and monitor. Seek care if above 120 bpm."),
+    ("hr_low", "heart_rate", [("heart_rate", "<", "hr_low")],
+     "Low heart rate ({heart_rate} bpm — bradycardia)",
+     "Rest and monitor. Contact doctor if you feel faint."),
+    ("sugar_high", "blood_sugar", [("blood_sugar", ">", "sugar_high")],
+     "High blood sugar ({blood_sugar} mg/dL)",
+     "Reduce carbohydrate intake and follow your diabetes care plan."),
+    ("sugar_low", "blood_sugar", [("blood_sugar", "<", "sugar_low")],
+     "Low blood sugar ({blood_sugar} mg/dL — hypoglycemia)",
+     "Consume fast-acting carbohydrates (juice/glucose tablets) immediately."),
+    ("spo2_low", "oxygen_level", [("oxygen_level", "<", "spo2_low")],
+     "Low oxygen saturation ({oxygen_level}% — below normal range)",
+     "Sit upright, breathe slowly. If below 90%, seek emergency care immediately."),
+]
+
+# Order of the readings tuple produced by parse_vitals()
+VITAL_SIGNALS = ("temperature", "systolic", "diastolic", "heart_rate", "blood_sugar", "oxygen_level")
+VITAL_ISSUE_CODES = [rule[0] for rule in VITAL_RULES]   # bit i ↔ VITAL_RULES[i]
+
+
+class VitalRuleEngine:
+    """VITAL_RULES compiled against one threshold set.
+    Each rule becomes (bit, ((signal index, is_greater, limit), ...)) grouped
+    per vital; evaluate() is generated from those groups as a flat if/elif
+    chain over a readings tuple, so scoring a patient is a handful of float
+    comparisons returning an issue bitmask — no strings or loops involved.
+    Missing readings are NaN, which fails every comparison.
+    """
+
+    def __init__(self, thresholds: dict):
+        self.thresholds = dict(thresholds)
+        groups = OrderedDict()
+        for bit, (_, vital, conditions, _, _) in enumerate(VITAL_RULES):
+            checks = tuple((VITAL_SIGNALS.index(signal), op == ">", float(thresholds[key]))
+                           for signal, op, key in conditions)
+            groups.setdefault(vital, []).append((1 << bit, checks))
+        self.groups = tuple(tuple(rules) for rules in groups.values())
+        self.evaluate = self._compile()
+
+    def _compile(self):
+        lines = ["def evaluate(readings):",
+                 f"    {', '.join(VITAL_SIGNALS)}, = readings",
+                 "    mask = 0"]
+        for rules in self.groups:
+            for i, (bit, checks) in enumerate(rules):
+                test = " or ".join(f"{VITAL_SIGNALS[idx]} {'>' if greater else '<'} {limit!r}"
+                                   for idx, greater, limit in checks)
+                lines.append(f"    {'elif' if i else 'if'} {test}: mask |= {bit}")
+        lines.append("    return mask")
+        namespace = {}
+        exec("\n".join(lines), namespace)
+        return namespace["evaluate"]
+
+
+DEFAULT_VITAL_ENGINE = VitalRuleEngine(VITAL_THRESHOLDS)
+VITAL_ENGINES = {procedure: VitalRuleEngine({**VITAL_THRESHOLDS, **overrides})
+                 for procedure, overrides in PROCEDURE_THRESHOLDS.items()}
+
+
+def vital_rules_for(surgery_type: str) -> VitalRuleEngine:
+    return VITAL_ENGINES.get(surgery_type or "", DEFAULT_VITAL_ENGINE)
+
 
+NOT_MEASURED = float("nan")
+
+
+def parse_vitals(vitals: dict):
+    """Convert a vitals payload into (readings tuple, display values).
+    Parsing matches the historical form handling: float temperature and
+    sugar, int heart rate and SpO₂, and "systolic/diastolic" blood pressure.
+    Anything unparseable or <= 0 is NOT_MEASURED in the readings.
+    """
+    get = vitals.get
     try:
-        temp = float(vitals.get("temperature", 0))
-        if temp > 99.5:
-            issues.append(f"Elevated temperature ({temp}°F — possible fever)")
-            recommendations.append("Stay hydrated, rest, and monitor temperature every 4 hours.")
-        elif temp < 96.0 and temp > 0:
-            issues.append(f"Low temperature ({temp}°F — possible hypothermia risk)")
-            recommendations.append("Keep warm and consult your doctor.")
+        temp = float(get("temperature", 0))
     except (ValueError, TypeError):
-        pass
-
+        temp = NOT_MEASURED
     try:
-        bp = vitals.get("blood_pressure", "")
-        if "/" in str(bp):
-            systolic, diastolic = [int(x.strip()) for x in str(bp).split("/")]
-            if systolic > 140 or diastolic > 90:
-                issues.append(f"High blood pressure ({bp} mmHg — hypertension range)")
-                recommendations.append("Reduce salt intake, limit stress, and consult your physician.")
-            elif systolic < 90 or diastolic < 60:
-                issues.append(f"Low blood pressure ({bp} mmHg — hypotension range)")
-                recommendations.append("Increase fluid intake, rise slowly from sitting/lying positions.")
+        hr = int(get("heart_rate", 0))
     except (ValueError, TypeError):
-        pass
-
+        hr = NOT_MEASURED
     try:
-        hr = int(vitals.get("heart_rate", 0))
-        if hr > 100:
-            issues.append(f"Elevated heart rate ({hr} bpm — tachycardia)")
-            recommendations.append("Rest, avoid caffeine, and monitor. Seek care if above 120 bpm.")
-        elif hr < 60 and hr > 0:
-            issues.append(f"Low heart rate ({hr} bpm — bradycardia)")
-            recommendations.append("Rest and monitor. Contact doctor if you feel faint.")
+        sugar = float(get("blood_sugar", 0))
     except (ValueError, TypeError):
-        pass
-
+        sugar = NOT_MEASURED
     try:
-        sugar = float(vitals.get("blood_sugar", 0))
-        if sugar > 180:
-            issues.append(f"High blood sugar ({sugar} mg/dL)")
-            recommendations.append("Reduce carbohydrate intake and follow your diabetes care plan.")
-        elif sugar < 70 and sugar > 0:
-            issues.append(f"Low blood sugar ({sugar} mg/dL — hypoglycemia)")
-            recommendations.append("Consume fast-acting carbohydrates (juice/glucose tablets) immediately.")
+        spo2 = int(get("oxygen_level", 0))
     except (ValueError, TypeError):
-        pass
+        spo2 = NOT_MEASURED
+
+    systolic = diastolic = NOT_MEASURED
+    bp = get("blood_pressure", "")
+    if "/" in str(bp):
+        try:
+            systolic, diastolic = [int(x.strip()) for x in str(bp).split("/")]
+        except (ValueError, TypeError):
+            pass
+
+    readings = (temp if temp > 0 else NOT_MEASURED,
+                systolic if systolic > 0 else NOT_MEASURED,
+                diastolic if diastolic > 0 else NOT_MEASURED,
+                hr if hr > 0 else NOT_MEASURED,
+                sugar if sugar > 0 else NOT_MEASURED,
+                spo2 if spo2 > 0 else NOT_MEASURED)
+    display = {"temperature": temp, "blood_pressure": bp, "heart_rate": hr,
+               "blood_sugar": sugar, "oxygen_level": spo2}
+    return readings, display
+
+
+VITALS_ALL_CLEAR = (
+    "✅ All your vitals appear to be within normal ranges. "
+    "Keep up the great work! Continue your prescribed regimen, "
+    "stay hydrated, and get adequate rest. Your next follow-up looks positive."
+)
+
+_summary_templates = {}
+
+
+def summary_template(mask: int) -> str:
+    """Summary text for an issue mask with {vital} placeholders (memoised per mask)."""
+    template = _summary_templates.get(mask)
+    if template is None:
+        rules = [rule for bit, rule in enumerate(VITAL_RULES) if mask >> bit & 1]
+        template = (f"⚠️ Health Analysis Summary — {len(rules)} concern(s) detected:\n\n"
+                    + "".join(f"• {rule[3]}\n" for rule in rules)
+                    + "\n📋 Recommendations:\n"
+                    + "".join(f"• {rule[4]}\n" for rule in rules)
+                    + "\nPlease share this report with your doctor at your next appointment.")
+        _summary_templates[mask] = template
+    return template
+
+
+_issue_codes_by_mask = {}
+
+
+def issue_codes(mask: int) -> list:
+    """Decode an issue bitmask into its code list (memoised per mask)."""
+    codes = _issue_codes_by_mask.get(mask)
+    if codes is None:
+        codes = [code for bit, code in enumerate(VITAL_ISSUE_CODES) if mask >> bit & 1]
+        _issue_codes_by_mask[mask] = codes
+    return codes
+
+
+class VitalsReport:
+    """Outcome of analyze_vitals(): the issue bitmask plus the raw values
+    needed to word it. Severity and issue codes come straight from the
+    mask; the summary text is only built when text() is called.
+    """
+    __slots__ = ("mask", "display", "readings", "trends")
+
+    def __init__(self, mask: int, display: dict, readings: tuple = None):
+        self.mask     = mask
+        self.display  = display
+        self.readings = readings
+        self.trends   = ()      # [(flag, text)] attached from the patient's history
+
+    @property
+    def issues(self) -> list:
+        return issue_codes(self.mask)
+
+    @property
+    def severity(self) -> str:
+        return "moderate" if self.mask or self.trends else "low"
+
+    @property
+    def emergency(self) -> bool:
+        # The vitals rules advise and escalate in their wording but never raise an alert
+        return False
+
+    def text(self) -> str:
+        summary = summary_template(self.mask).format_map(self.display) if self.mask else VITALS_ALL_CLEAR
+        if self.trends:
+            summary += "\n\n📈 Trends:\n" + "\n".join(f"• {text}" for _, text in self.trends)
+        return summary
+
+    def __str__(self):
+        return self.text()
+
+
+def analyze_vitals(vitals: dict, surgery_type: str = "") -> VitalsReport:
+    """Score submitted vitals against the rules for the patient's procedure."""
+    readings, display = parse_vitals(vitals)
+    return VitalsReport(vital_rules_for(surgery_type).evaluate(readings), display, readings)
+
+
+VITALS_BATCH_FIELDS = ("temperature", "blood_pressure_systolic", "blood_pressure_diastolic",
+                       "heart_rate", "blood_sugar", "oxygen_level")
+VITALS_BATCH_MAX = int(os.getenv("VITALS_BATCH_MAX", "10000"))
+
+
+def analyze_vitals_batch(columns: dict, surgery_type=""):
+    """Score many patients at once with the same compiled rules as analyze_vitals().
+    `columns` maps VITALS_BATCH_FIELDS to equal-length sequences (None or
+    <= 0 means not measured). `surgery_type` is one procedure for the whole
+    batch or a per-patient list. Returns a NumPy array of issue bitmasks.
+    """
+    import numpy as np
+
+    signals = dict(zip(VITALS_BATCH_FIELDS, VITAL_SIGNALS))
+    cols = [None] * len(VITAL_SIGNALS)
+    n = 0
+    with np.errstate(invalid="ignore"):
+        for field, values in columns.items():
+            col = np.asarray(values, dtype=np.float64)
+            col[~(col > 0)] = np.nan
+            cols[VITAL_SIGNALS.index(signals[field])] = col
+            n = len(col)
+
+    masks = np.zeros(n, dtype=np.uint16)
+    if isinstance(surgery_type, list):
+        procedures = np.asarray(surgery_type, dtype=object)
+        batches = [(vital_rules_for(p), procedures == p) for p in set(surgery_type)]
+    else:
+        batches = [(vital_rules_for(surgery_type), None)]
+
+    for engine, rows in batches:
+        part = [c if c is None or rows is None else c[rows] for c in cols]
+        part_masks = np.zeros(n if rows is None else int(rows.sum()), dtype=np.uint16)
+        for rules in engine.groups:
+            taken = np.zeros(len(part_masks), dtype=bool)
+            for bit, checks in rules:
+                hit = np.zeros(len(part_masks), dtype=bool)
+                for idx, greater, limit in checks:
+                    col = part[idx]
+                    if col is not None:
+                        hit |= (col > limit) if greater else (col < limit)
+                hit &= ~taken
+                part_masks[hit] |= np.uint16(bit)
+                taken |= hit
+        if rows is None:
+            masks = part_masks
+        else:
+            masks[rows] = part_masks
+    return masks
+
+
+REPLY_ALERT_PATTERN = re.compile(r"🚨|call 108|emergency|immediately|seek care|doctor now", re.IGNORECASE)
+
+
+def reply_severity(text: str):
+    """Basic (severity, is_emergency) detection from reply keywords.
+    Only needed for free-text chat replies; vitals carry a VitalsReport.
+    """
+    is_emergency = REPLY_ALERT_PATTERN.search(text) is not None
+    severity     = "high" if is_emergency else ("moderate" if "⚠️" in text else "low")
+    return severity, is_emergency
+
+
+def sse_event(data: dict, event: str = None) -> str:
+    """Format one Server-Sent Events frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 
+def sse_response(events):
+    return Response(stream_with_context(events), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ─────────────────────────────────────────────
+#  Vitals History (per-patient time series)
+# ─────────────────────────────────────────────
+
+VITALS_HISTORY      = os.getenv("VITALS_HISTORY", "1") == "1"
+VITALS_DIR          = os.getenv("VITALS_DIR", os.path.join(BASE_DIR, "vitals_data"))
+VITALS_TREND_HOURS  = float(os.getenv("VITALS_TREND_HOURS", "48"))
+VITALS_TREND_POINTS = int(os.getenv("VITALS_TREND_POINTS", "3"))   # min readings before a trend is reported
+VITALS_CLOCK_SKEW   = float(os.getenv("VITALS_CLOCK_SKEW", "300"))   # seconds of device clock drift tolerated
+
+# One fixed-width record per reading: unix timestamp + VITAL_SIGNALS (NaN = not measured)
+VITALS_RECORD = struct.Struct("<" + "d" * (1 + len(VITAL_SIGNALS)))
+
+# (trend flag, signal, direction, minimum change per day, text)
+VITAL_TRENDS = [
+    ("temp_rising",  "temperature",  +1, 1.0,  "Temperature has been rising over the last {hours:g}h ({slope:+.1f}°F/day)."),
+    ("bp_rising",    "systolic",     +1, 10.0, "Systolic blood pressure has been rising over the last {hours:g}h ({slope:+.0f} mmHg/day)."),
+    ("hr_rising",    "heart_rate",   +1, 10.0, "Heart rate has been rising over the last {hours:g}h ({slope:+.0f} bpm/day)."),
+    ("sugar_rising", "blood_sugar",  +1, 30.0, "Blood sugar has been rising over the last {hours:g}h ({slope:+.0f} mg/dL/day)."),
+    ("spo2_falling", "oxygen_level", -1, 2.0,  "Oxygen saturation has been falling over the last {hours:g}h ({slope:+.1f}%/day)."),
+]
+
+
+class VitalsStore:
+    """Append-only columnar history of vitals, one binary file per patient.
+    Appends are a single fixed-size write (O(1), no read-modify-write).
+    Window queries memory-map the file and binary-search the timestamp
+    column, so only the pages inside the window are ever read — a patient
+    with millions of readings costs the same as one with a hundred.
+    """
+
+    def __init__(self, root: str):
+        self.root  = root
+        self._lock = threading.Lock()
+
+    def path(self, patient: str) -> str:
+        key = hashlib.sha1(patient.strip().lower().encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.root, f"{key}.vts")
+
+    def append(self, patient: str, readings: tuple, ts: float = None):
+        """Append one reading. window() binary-searches the timestamps, so a
+        `ts` more than VITALS_CLOCK_SKEW older than the patient's last stored
+        reading, or in the future, raises ValueError instead of being
+        written out of order; smaller drift is clamped to the last reading.
+        """
+        now = time.time()
+        if ts is None:
+            ts = now
+        elif not ts <= now + VITALS_CLOCK_SKEW:
+            raise ValueError(f"timestamp {ts} is in the future")
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.path(patient), "a+b") as f:
+                size = f.seek(0, os.SEEK_END) // VITALS_RECORD.size * VITALS_RECORD.size
+                if size:
+                    f.seek(size - VITALS_RECORD.size)
+                    last = VITALS_RECORD.unpack(f.read(VITALS_RECORD.size))[0]
+                    if last - ts > VITALS_CLOCK_SKEW:
+                        raise ValueError(f"timestamp {ts} is older than the last stored reading")
+                    ts = max(ts, last)      # small clock jitter: keep the column sorted
+                f.write(VITALS_RECORD.pack(ts, *readings))
+
+    def count(self, patient: str) -> int:
+        try:
+            return os.path.getsize(self.path(patient)) // VITALS_RECORD.size
+        except OSError:
+            return 0
+
+    def window(self, patient: str, hours: float, now: float = None):
+        """Readings from the last `hours` as a NumPy structured array (ts + VITAL_SIGNALS)."""
+        import numpy as np
+
+        dtype = np.dtype([("ts", "<f8")] + [(name, "<f8") for name in VITAL_SIGNALS])
+        count = self.count(patient)     # ignores a torn trailing record
+        if not count:
+            return np.empty(0, dtype=dtype)
+        history = np.memmap(self.path(patient), dtype=dtype, mode="r", shape=(count,))
+        since   = (time.time() if now is None else now) - hours * 3600
+        start   = int(np.searchsorted(history["ts"], since))
+        return np.array(history[start:])
+
+    def stats(self, patient: str, hours: float = VITALS_TREND_HOURS, now: float = None) -> dict:
+        """Per-signal {count, mean, min, max, slope_per_day} over the window."""
+        import numpy as np
+
+        rows   = self.window(patient, hours, now)
+        result = {}
+        for name in VITAL_SIGNALS:
+            values = rows[name]
+            valid  = ~np.isnan(values)
+            n      = int(valid.sum())
+            if not n:
+                result[name] = {"count": 0, "mean": None, "min": None, "max": None, "slope_per_day": None}
+                continue
+            y = values[valid]
+            x = rows["ts"][valid] / 86400.0
+            slope = None
+            if n >= 2 and x[-1] > x[0]:
+                dx    = x - x.mean()
+                slope = float((dx * (y - y.mean())).sum() / (dx * dx).sum())
+            result[name] = {"count": n, "mean": float(y.mean()), "min": float(y.min()),
+                            "max": float(y.max()), "slope_per_day": slope}
+        return result
+
+    def trend_flags(self, patient: str, hours: float = VITALS_TREND_HOURS, now: float = None) -> list:
+        """[(flag, text)] for every VITAL_TRENDS rule the window satisfies."""
+        stats = self.stats(patient, hours, now)
+        flags = []
+        for flag, signal, direction, min_change, text in VITAL_TRENDS:
+            s = stats[signal]
+            if s["count"] >= VITALS_TREND_POINTS and s["slope_per_day"] is not None \
+                    and s["slope_per_day"] * direction >= min_change:
+                flags.append((flag, text.format(hours=hours, slope=s["slope_per_day"])))
+        return flags
+
+
+vitals_store = VitalsStore(VITALS_DIR)
+
+
+def vitals_patient_key(patient_id=None, patient_name: str = None):
+    """History key for a reading: "id:<patient_id>" when the caller supplies a
+    stable id, else an id private to this browser session and patient name.
+    Display names alone are never keys — the default "Patient" is shared by
+    every anonymous user and real names collide. None outside a request.
+    """
+    if patient_id is not None and str(patient_id).strip():
+        return f"id:{str(patient_id).strip()}"
+    if not has_request_context():
+        return None
+    name = (patient_name or session.get("patient_name", "")).strip()
+    ids  = session.get("vitals_ids", {})
+    if name not in ids:
+        session["vitals_ids"] = ids = {**ids, name: uuid.uuid4().hex}
+    return f"session:{ids[name]}"
+
+
+def record_vitals(patient_key: str, report: VitalsReport) -> VitalsReport:
+    """Append a scored reading to the patient's history and attach trend flags."""
+    if not VITALS_HISTORY or not patient_key:
+        return report
     try:
-        spo2 = int(vitals.get("oxygen_level", 0))
-        if spo2 < 94 and spo2 > 0:
-            issues.append(f"Low oxygen saturation ({spo2}% — below normal range)")
-            recommendations.append("Sit upright, breathe slowly. If below 90%, seek emergency care immediately.")
-    except (ValueError, TypeError):
-        pass
+        vitals_store.append(patient_key, report.readings)
+        report.trends = vitals_store.trend_flags(patient_key)
+    except ImportError:
+        pass    # history is still recorded; trend queries need NumPy
+    except OSError as e:
+        print(f"[WARN] Vitals history unavailable: {e}")
+    return report
+
+
+# ─────────────────────────────────────────────
+#  Bedside Vitals Stream (sliding-window alerts)
+# ─────────────────────────────────────────────
+
+VITALS_STREAM_WINDOW   = int(os.getenv("VITALS_STREAM_WINDOW", "10"))       # samples per vital
+VITALS_STREAM_PATIENTS = int(os.getenv("VITALS_STREAM_PATIENTS", "1000"))   # tracked at once (LRU)
+VITALS_STREAM_MAX_LINE = int(os.getenv("VITALS_STREAM_MAX_LINE", "4096"))   # bytes per NDJSON sample
+
+
+class RollingWindow:
+    """Last `size` samples of one vital with O(1) push, mean, min and max.
+    Keeps a running sum plus monotonic deques for the extremes.
+    """
+    __slots__ = ("size", "values", "total", "seq", "lows", "highs")
+
+    def __init__(self, size: int):
+        self.size   = size
+        self.values = deque()
+        self.total  = 0.0
+        self.seq    = 0
+        self.lows   = deque()    # (seq, value), values increasing
+        self.highs  = deque()    # (seq, value), values decreasing
+
+    def push(self, value: float):
+        self.values.append(value)
+        self.total += value
+        if len(self.values) > self.size:
+            self.total -= self.values.popleft()
+        while self.lows and self.lows[-1][1] >= value:
+            self.lows.pop()
+        while self.highs and self.highs[-1][1] <= value:
+            self.highs.pop()
+        self.lows.append((self.seq, value))
+        self.highs.append((self.seq, value))
+        oldest = self.seq - self.size
+        if self.lows[0][0] <= oldest:
+            self.lows.popleft()
+        if self.highs[0][0] <= oldest:
+            self.highs.popleft()
+        self.seq += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / len(self.values) if self.values else NOT_MEASURED
+
+    @property
+    def low(self) -> float:
+        return self.lows[0][1] if self.values else NOT_MEASURED
+
+    @property
+    def high(self) -> float:
+        return self.highs[0][1] if self.values else NOT_MEASURED
+
+    def snapshot(self) -> dict:
+        if not self.values:
+            return None
+        return {"mean": round(self.mean, 2), "min": self.low,
+                "max": self.high, "count": len(self.values)}
+
+
+class PatientStream:
+    __slots__ = ("windows", "mask")
+
+    def __init__(self, size: int):
+        self.windows = tuple(RollingWindow(size) for _ in VITAL_SIGNALS)
+        self.mask    = 0
+
+
+class VitalsStreamMonitor:
+    """Sliding-window vitals per patient, scored with the analyze_vitals() rules.
+    Every sample updates the windows in O(1); the sample itself and the
+    window minima and maxima are run through the patient's compiled
+    VitalRuleEngine, so one critical reading is never averaged away. An
+    alert is raised as soon as a new issue appears, and a clear once every
+    out-of-range reading has left the window.
+    Windows are keyed by `key` (see vitals_stream()); `patient` is only the
+    display name echoed in events. Memory is VITALS_STREAM_WINDOW samples
+    per vital per patient, for at most VITALS_STREAM_PATIENTS patients.
+    """
 
-    if not issues:
-        return ("✅ All your vitals appear to be within normal ranges. "
-                "Keep up the great work! Continue your prescribed regimen, "
-                "stay hydrated, and get adequate rest. Your next follow-up looks positive.")
+    def __init__(self, window: int, max_patients: int):
+        self.window       = window
+        self.max_patients = max_patients
+        self._patients    = OrderedDict()
+        self._lock        = threading.Lock()
+
+    def observe(self, key: str, patient: str, readings: tuple, surgery_type: str = ""):
+        """Add one sample; returns an alert/clear event dict or None."""
+        engine = vital_rules_for(surgery_type)
+        with self._lock:
+            state = self._patients.get(key)
+            if state is None:
+                state = self._patients[key] = PatientStream(self.window)
+                if len(self._patients) > self.max_patients:
+                    self._patients.popitem(last=False)
+            else:
+                self._patients.move_to_end(key)
+
+            for window, value in zip(state.windows, readings):
+                if value == value:      # skip NaN (not measured)
+                    window.push(value)
+            mask = (engine.evaluate(readings)
+                    | engine.evaluate(tuple(w.low for w in state.windows))
+                    | engine.evaluate(tuple(w.high for w in state.windows)))
+            previous = state.mask
+            state.mask = mask
+            if mask & ~previous:
+                event = "alert"
+            elif previous and not mask:
+                event = "clear"
+            else:
+                return None
+            window = {name: w.snapshot() for name, w in zip(VITAL_SIGNALS, state.windows) if w.values}
+
+        return {
+            "event":        event,
+            "patient_name": patient,
+            "new_issues":   issue_codes(mask & ~previous),
+            "issues":       issue_codes(mask),
+            "window":       window,
+        }
+
+
+vitals_monitor = VitalsStreamMonitor(VITALS_STREAM_WINDOW, VITALS_STREAM_PATIENTS)
+
+
+def stream_sample_vitals(sample: dict) -> dict:
+    """Accept either the form's "s/d" blood_pressure or the SPA's split fields."""
+    if "blood_pressure" not in sample and "blood_pressure_systolic" in sample:
+        sample = dict(sample, blood_pressure=f"{sample.get('blood_pressure_systolic', 0)}/"
+                                             f"{sample.get('blood_pressure_diastolic', 0)}")
+    return sample
+
+
+# ─────────────────────────────────────────────
+#  Appointment Booking (per-doctor interval index)
+# ─────────────────────────────────────────────
+
+APPOINTMENT_MINUTES      = int(os.getenv("APPOINTMENT_MINUTES", "30"))
+APPOINTMENT_ALTERNATIVES = int(os.getenv("APPOINTMENT_ALTERNATIVES", "3"))
+APPOINTMENT_SEARCH_DAYS  = int(os.getenv("APPOINTMENT_SEARCH_DAYS", "7"))
+AVAILABILITY_MAX_DAYS    = int(os.getenv("AVAILABILITY_MAX_DAYS", "120"))
+CLINIC_OPEN              = os.getenv("CLINIC_OPEN", "09:00")
+CLINIC_CLOSE             = os.getenv("CLINIC_CLOSE", "17:00")
+
+# Bookable doctors and their specialty (both the SPA and the appointments page lists)
+DOCTORS = {
+    "Dr. Smith (Cardiologist)":           "Cardiologist",
+    "Dr. Jane (General Physician)":       "General Physician",
+    "Dr. Ali (Endocrinologist)":          "Endocrinologist",
+    "Dr. Roberts (Orthopedic Surgeon)":   "Orthopedic Surgeon",
+    "Dr. Lee (Neurologist)":              "Neurologist",
+    "Dr. Patel (Gastroenterologist)":     "Gastroenterologist",
+    "Dr. Garcia (Pulmonologist)":         "Pulmonologist",
+    "Dr. Ramesh Gupta — Cardiologist":    "Cardiologist",
+    "Dr. Anita Sharma — General Physician": "General Physician",
+    "Dr. Vikram Nair — Orthopedic Surgeon": "Orthopedic Surgeon",
+    "Dr. Priya Menon — Endocrinologist":  "Endocrinologist",
+    "Dr. Sanjay Rao — Pulmonologist":     "Pulmonologist",
+    "Dr. Kavitha Reddy — Gynecologist":   "Gynecologist",
+    "Dr. Arun Kumar — Neurologist":       "Neurologist",
+}
+
+
+def clock_minutes(value: str) -> int:
+    hours, minutes = value.strip().split(":")[:2]
+    if not (0 <= int(hours) < 24 and 0 <= int(minutes) < 60):
+        raise ValueError(f"bad time {value!r}")
+    return int(hours) * 60 + int(minutes)
+
+
+# The bookable grid: CLINIC_SLOTS slots of APPOINTMENT_MINUTES from CLINIC_OPEN each day
+CLINIC_OPEN_MINUTE = clock_minutes(CLINIC_OPEN)
+CLINIC_SLOTS       = max(0, (clock_minutes(CLINIC_CLOSE) - CLINIC_OPEN_MINUTE) // APPOINTMENT_MINUTES)
+CLINIC_ALL_FREE    = (1 << CLINIC_SLOTS) - 1
+
+
+def slot_minute(date: str, time_val: str) -> int:
+    """'YYYY-MM-DD' + 'HH:MM' → minutes on a continuous clock (ordinal day * 1440)."""
+    import datetime as _dt
+    return _dt.date.fromisoformat(date.strip()).toordinal() * 1440 + clock_minutes(time_val)
+
+
+def slot_label(minute: int) -> dict:
+    import datetime as _dt
+    day, clock = divmod(minute, 1440)
+    return {"date": _dt.date.fromordinal(day).isoformat(), "time": f"{clock // 60:02d}:{clock % 60:02d}"}
+
+
+class DoctorSchedule:
+    """Booked [start, end) intervals for one doctor, kept sorted by start.
+    Bookings never overlap, so ends are sorted too and a conflict check is
+    one bisect plus a look at the two neighbours — O(log n).
+    Alongside, `busy` maps ordinal day → bitmap of clinic-grid slots that a
+    booking touches; a day with no entry is entirely free, so availability
+    search is a few integer operations per day.
+    """
+    __slots__ = ("starts", "ends", "busy")
+
+    def __init__(self):
+        self.starts = []
+        self.ends   = []
+        self.busy   = {}
+
+    def conflicts(self, start: int, end: int) -> bool:
+        i = bisect_left(self.starts, end)       # intervals starting before `end`
+        return i > 0 and self.ends[i - 1] > start
+
+    def add(self, start: int, end: int):
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        day, clock = divmod(start, 1440)
+        first = max(0, (clock - CLINIC_OPEN_MINUTE) // APPOINTMENT_MINUTES)
+        last  = min(CLINIC_SLOTS, -(-(clock + end - start - CLINIC_OPEN_MINUTE) // APPOINTMENT_MINUTES))
+        if first < last:
+            self.busy[day] = self.busy.get(day, 0) | (((1 << (last - first)) - 1) << first)
+
+    def free_slots(self, after: int, days: int):
+        """Yield free grid-slot minutes in order, from `after` for `days` days."""
+        first_day = after // 1440
+        for day in range(first_day, first_day + days):
+            free = CLINIC_ALL_FREE & ~self.busy.get(day, 0)
+            if day == first_day:        # drop slots starting before `after`
+                skip = -(-(after % 1440 - CLINIC_OPEN_MINUTE) // APPOINTMENT_MINUTES)
+                if skip > 0:
+                    free &= ~((1 << skip) - 1)
+            while free:
+                low = free & -free
+                yield day * 1440 + CLINIC_OPEN_MINUTE + (low.bit_length() - 1) * APPOINTMENT_MINUTES
+                free ^= low
+
+    def nearest_free(self, start: int, duration: int, count: int, not_before: int) -> list:
+        """Up to `count` free slots closest to `start`, on the clinic-hours grid,
+        within APPOINTMENT_SEARCH_DAYS either side and not before `not_before`.
+        """
+        opens     = CLINIC_OPEN_MINUTE
+        first_day = start // 1440 - APPOINTMENT_SEARCH_DAYS
+        last_day  = start // 1440 + APPOINTMENT_SEARCH_DAYS
+        per_day   = max(0, (clock_minutes(CLINIC_CLOSE) - opens) // duration)
+
+        def slot(k):            # k-th grid slot counted from first_day's opening
+            day, n = divmod(k, per_day)
+            return (first_day + day) * 1440 + opens + n * duration
+
+        if not per_day:
+            return []
+        total = (last_day - first_day + 1) * per_day
+        lo, hi = 0, total       # binary search the first grid slot at/after `start`
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if slot(mid) < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        found, after, before = [], lo, lo - 1
+        while len(found) < count and (after < total or before >= 0):
+            take_after = before < 0 or (after < total and slot(after) - start <= start - slot(before))
+            k = after if take_after else before
+            if take_after:
+                after += 1
+            else:
+                before -= 1
+            candidate = slot(k)
+            if candidate >= not_before and not self.conflicts(candidate, candidate + duration):
+                found.append(candidate)
+        return sorted(found)
+
+
+class PastSlotError(ValueError):
+    """A booking for a slot that has already started."""
+
+
+class AppointmentBook:
+    """Conflict-free booking across every worker process.
+    Each process keeps a DoctorSchedule per doctor and, with the SQLite
+    backend, catches up on appointments other processes recorded inside
+    the same BEGIN IMMEDIATE transaction that checks and inserts — so a
+    slot can only ever be granted once. With the text backend the check is
+    atomic within this process only.
+    """
 
-    summary = f"⚠️ Health Analysis Summary — {len(issues)} concern(s) detected:\n\n"
-    for issue in issues:
-        summary += f"• {issue}\n"
-    summary += "\n📋 Recommendations:\n"
-    for rec in recommendations:
-        summary += f"• {rec}\n"
-    summary += "\nPlease share this report with your doctor at your next appointment."
-    return summary
+    def __init__(self, duration: int):
+        self.duration   = duration
+        self._doctors   = {}
+        self._lock      = threading.Lock()
+        self._last_id   = 0
+        self._text_seen = False
+
+    def schedule(self, doctor: str) -> DoctorSchedule:
+        key = doctor.strip().lower()
+        sched = self._doctors.get(key)
+        if sched is None:
+            sched = self._doctors[key] = DoctorSchedule()
+        return sched
+
+    def _remember(self, doctor, date, time_val):
+        try:
+            start = slot_minute(date, time_val)
+        except (ValueError, TypeError, AttributeError):
+            return              # legacy free-form entries can't block a slot
+        sched = self.schedule(doctor or "")
+        if not sched.conflicts(start, start + self.duration):
+            sched.add(start, start + self.duration)
+
+    def _sync(self):
+        if EVENTS_BACKEND == "sqlite":
+            for row in event_store.appointments_since(self._last_id):
+                self._remember(row["doctor"], row["appt_date"], row["appt_time"])
+                self._last_id = row["id"]
+        elif not self._text_seen and os.path.exists(RESPONSES_FILE):
+            with open(RESPONSES_FILE, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    event = import_row(line.strip())
+                    if event and event[1] == "appointment":
+                        self._remember(*event[7:10])
+            self._text_seen = True
+
+    def book(self, patient_name: str, doctor: str, date: str, time_val: str, language: str):
+        """Returns (True, None) when booked, or (False, [alternative slots]) on a clash.
+        Raises ValueError for an unparseable date/time, PastSlotError for a
+        slot before now (the bound nearest_free() applies to alternatives).
+        """
+        start      = slot_minute(date, time_val)
+        end        = start + self.duration
+        now        = time.localtime()
+        now_minute = slot_minute(time.strftime("%Y-%m-%d", now), time.strftime("%H:%M", now))
+        if start < now_minute:
+            raise PastSlotError(f"{date} {time_val} is in the past")
+
+        with self._lock:
+            if EVENTS_BACKEND == "sqlite":
+                with event_store.transaction():
+                    self._sync()
+                    sched = self.schedule(doctor)
+                    if sched.conflicts(start, end):
+                        return False, [slot_label(m) for m in sched.nearest_free(
+                            start, self.duration, APPOINTMENT_ALTERNATIVES, now_minute)]
+                    self._last_id = event_store.record_appointment(
+                        patient_name, doctor, date.strip(), time_val.strip(), language)
+                    sched.add(start, end)
+                return True, None
+
+            self._sync()
+            sched = self.schedule(doctor)
+            if sched.conflicts(start, end):
+                return False, [slot_label(m) for m in sched.nearest_free(
+                    start, self.duration, APPOINTMENT_ALTERNATIVES, now_minute)]
+            import datetime as _dt
+            timestamp = _dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            responses_log.append(f"[{timestamp}] APPOINTMENT | Patient: {log_field(patient_name)} | "
+                                 f"Doctor: {log_field(doctor)} | Date: {log_field(date)} | "
+                                 f"Time: {log_field(time_val)} | Lang: {log_field(language)}\n")
+            sched.add(start, end)
+            return True, None
+
+    def availability(self, doctors: list, after: int, days: int, limit: int) -> list:
+        """Free slots as (minute, doctor) across `doctors`, earliest first, at most `limit`."""
+        with self._lock:
+            self._sync()
+            per_doctor = []
+            for doctor in doctors:
+                sched = self._doctors.get(doctor.strip().lower()) or DoctorSchedule()
+                per_doctor.append(((minute, doctor) for minute in sched.free_slots(after, days)))
+            return list(islice(heapq.merge(*per_doctor), limit))
+
+
+appointment_book = AppointmentBook(APPOINTMENT_MINUTES)
+
+
+def doctors_matching(doctor: str = "", specialty: str = "") -> list:
+    """Directory doctors by exact name or specialty (case-insensitive); all if neither."""
+    if doctor:
+        known = {name.lower(): name for name in DOCTORS}
+        return [known.get(doctor.strip().lower(), doctor.strip())]
+    specialty = specialty.strip().lower()
+    return [name for name, spec in DOCTORS.items()
+            if not specialty or specialty in spec.lower()]
 
 
 # ─────────────────────────────────────────────
@@ -661,7 +2290,11 @@ def chat():
         user_message = data.get("message", "").strip()
         if not user_message:
             return jsonify({"error": "No message provided"}), 400
-        response = ask_llm(user_message)
+        try:
+            response = ask_llm(user_message,
+                               conversation_id=conversation_key(session.get("patient_name", "")))
+        except LLMSaturated:
+            return llm_busy_response()
         return jsonify({"response": response})
     patient_name = session.get("patient_name", "Patient")
     return render_template("chat.html", t=t,
@@ -670,13 +2303,37 @@ def chat():
                            ai_greeting=t["ai_greeting"].format(name=patient_name))
 
 
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Streaming variant of POST /chat (Server-Sent Events)."""
+    data = request.get_json(silent=True) or {}
+    user_message = data.get("message", "").strip()
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    conversation_id = conversation_key(session.get("patient_name", ""))
+
+    def generate():
+        for delta in ask_llm_stream(user_message, conversation_id):
+            yield sse_event({"delta": delta})
+        yield sse_event({}, event="done")
+
+    return sse_response(generate())
+
+
 @app.route("/health", methods=["GET", "POST"])
 def health():
     t = get_t()
     if request.method == "POST":
         data = request.get_json(silent=True) or {}
-        summary = analyze_vitals(data)
-        return jsonify({"summary": summary})
+        report = analyze_vitals(data, session.get("surgery_type", ""))
+        record_vitals(vitals_patient_key(data.get("patient_id")), report)
+        return jsonify({
+            "summary":  report.text(),
+            "severity": report.severity,
+            "issues":   report.issues,
+            "trends":   [flag for flag, _ in report.trends],
+        })
     patient_name = session.get("patient_name", "Patient")
     return render_template("health.html", t=t,
                            patient_name=patient_name,
@@ -696,50 +2353,192 @@ def appointments():
 #  IVR Call Trigger
 # ─────────────────────────────────────────────
 
+# "session": calls run in-process as ivr_sessions and are driven over
+# /ivr/calls; "terminal": each call opens offline_ivr.py in a terminal window.
+# The SPA has no keypad UI yet, so its customer-care button stays on terminal.
+IVR_MODE      = os.getenv("IVR_MODE", "session")
+IVR_CARE_MODE = os.getenv("IVR_CARE_MODE", "terminal")
+
+
+def launch_terminal_ivr(patient_name, language):
+    ivr_script    = os.path.join(BASE_DIR, "offline_ivr.py")
+    terminal_cmds = [
+        ["gnome-terminal", "--", sys.executable, ivr_script, patient_name, language],
+        ["xterm",          "-e", f'{sys.executable} "{ivr_script}" "{patient_name}" "{language}"'],
+        ["x-terminal-emulator", "-e", f'{sys.executable} "{ivr_script}" "{patient_name}" "{language}"'],
+    ]
+    for cmd in terminal_cmds:
+        try:
+            subprocess.Popen(cmd, cwd=BASE_DIR)
+            return
+        except FileNotFoundError:
+            continue
+    subprocess.Popen([sys.executable, ivr_script, patient_name, language], cwd=BASE_DIR)
+
+
+def start_ivr_call(patient_name, language, message, mode=None):
+    """Start a follow-up call in `mode` (default IVR_MODE) and build the JSON reply."""
+    if (mode or IVR_MODE) == "terminal":
+        try:
+            launch_terminal_ivr(patient_name, language)
+        except Exception as e:
+            return jsonify({"status": "error", "message": f"Failed to launch IVR: {str(e)}"}), 500
+        return jsonify({"status": "success", "message": message + " Check the terminal window."})
+
+    call = call_sessions.start(patient_name, language)
+    if call is None:
+        return jsonify({"status": "error", "message": "All IVR lines are busy. Please try again shortly."}), 503
+    return jsonify({"status": "success", "message": message, "call": call.to_dict()})
+
+
 @app.route("/start-call", methods=["POST"])
 def start_call():
     patient_name = session.get("patient_name", "Patient")
     language     = session.get("language", "English")
-    ivr_script   = os.path.join(BASE_DIR, "offline_ivr.py")
+    return start_ivr_call(patient_name, language, f"📞 Follow-up call initiated for {patient_name}!")
 
-    try:
-        terminal_cmds = [
-            ["gnome-terminal", "--", sys.executable, ivr_script, patient_name, language],
-            ["xterm", "-e", f"{sys.executable} {ivr_script} \"{patient_name}\" \"{language}\""],
-            ["x-terminal-emulator", "-e", f"{sys.executable} {ivr_script} \"{patient_name}\" \"{language}\""],
-        ]
-        launched = False
-        for cmd in terminal_cmds:
-            try:
-                subprocess.Popen(cmd, cwd=BASE_DIR)
-                launched = True
-                break
-            except FileNotFoundError:
-                continue
 
-        if not launched:
-            subprocess.Popen([sys.executable, ivr_script, patient_name, language], cwd=BASE_DIR)
+@app.route("/ivr/calls", methods=["GET", "POST"])
+def ivr_calls():
+    """POST {patient_name, language} starts an in-process call; GET returns line stats."""
+    if request.method == "GET":
+        return jsonify(call_sessions.stats())
+    data = request.get_json(silent=True) or {}
+    call = call_sessions.start(data.get("patient_name") or session.get("patient_name", "Patient"),
+                               data.get("language") or session.get("language", "English"))
+    if call is None:
+        return jsonify({"error": "All IVR lines are busy."}), 503
+    return jsonify(call.to_dict()), 201
 
-        return jsonify({
-            "status": "success",
-            "message": f"📞 Follow-up call initiated for {patient_name}! Check the terminal window."
-        })
+
+@app.route("/ivr/calls/<call_id>", methods=["GET", "DELETE"])
+def ivr_call(call_id):
+    """GET the call's state; DELETE hangs up (nothing is logged, as when a caller drops)."""
+    try:
+        call = call_sessions.hangup(call_id) if request.method == "DELETE" else call_sessions.get(call_id)
+    except KeyError:
+        call = None
+    except CallStateError as e:
+        return jsonify({"error": str(e)}), 409
+    if call is None:
+        return jsonify({"error": "unknown or finished call"}), 404
+    return jsonify(call.to_dict())
+
+
+@app.route("/ivr/calls/<call_id>/keypad", methods=["POST"])
+def ivr_keypad(call_id):
+    """Expects JSON: {digits}. Logs the outcome and returns the response prompts."""
+    data = request.get_json(silent=True) or {}
+    try:
+        call = call_sessions.press(call_id, data.get("digits", ""))
+    except KeyError:
+        return jsonify({"error": "unknown or finished call"}), 404
+    except CallStateError as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
-        return jsonify({"status": "error", "message": f"Failed to launch IVR: {str(e)}"}), 500
+        print(f"[WARN] IVR outcome not recorded: {e}")
+        return jsonify({"error": "Could not record your choice; please try again."}), 503
+    return jsonify(call.to_dict())
+
+
+@app.route("/ivr/audio/<key>")
+def ivr_audio(key):
+    """Prerendered prompt audio (bundle or TTS cache) by its cache key."""
+    if not re.fullmatch(r"[0-9a-f]{64}", key):
+        return jsonify({"error": "bad key"}), 404
+    path = offline_ivr.bundle_get(key) or offline_ivr.tts_cache_get(key)
+    if path is None:
+        return jsonify({"error": "no audio"}), 404
+    return send_from_directory(os.path.dirname(path), os.path.basename(path), mimetype="audio/mpeg")
+
+
+# ─────────────────────────────────────────────
+#  LLM Status
+# ─────────────────────────────────────────────
+
+@app.route("/llm-status")
+def llm_status():
+    """Circuit-breaker state plus cache, executor and coalescing counters."""
+    return jsonify({
+        "breaker":       llm_breaker.stats(),
+        "conversations": conversations.stats(),
+        "cache":         llm_cache.stats(),
+        "executor":      llm_gate.stats(),
+        "coalescing":    llm_flights.stats(),
+    })
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of request, LLM and cache metrics."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+
+    breaker = llm_breaker.stats()
+    snapshot = [
+        ("medfollow_llm_breaker_open", "gauge", "1 while the OpenAI circuit is open or half-open.",
+         int(breaker["state"] != CircuitBreaker.CLOSED)),
+        ("medfollow_llm_breaker_trips_total", "counter", "Times the OpenAI circuit has opened.",
+         breaker["trips"]),
+        ("medfollow_llm_short_circuited_total", "counter", "Calls refused by the open circuit.",
+         breaker["short_circuited"]),
+        ("medfollow_llm_executor_in_use", "gauge", "LLM executor slots in use.",
+         llm_gate.stats()["in_use"]),
+        ("medfollow_llm_executor_rejected_total", "counter", "Calls refused by a full LLM executor.",
+         llm_gate.stats()["rejected"]),
+        ("medfollow_llm_coalesced_total", "counter", "Requests that shared an in-flight LLM call.",
+         llm_flights.stats()["coalesced"]),
+    ]
+    for key, value in llm_cache.stats().items():
+        kind = "gauge" if key in ("entries", "bytes") else "counter"
+        suffix = "" if kind == "gauge" else "_total"
+        snapshot.append((f"medfollow_llm_cache_{key}{suffix}", kind, f"LLM response cache {key}.", value))
+    for name, kind, help_text, value in snapshot:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
 
 
 # ─────────────────────────────────────────────
 #  Response Log (preserved from original)
 # ─────────────────────────────────────────────
 
+LOG_PAGE_SIZE = int(os.getenv("LOG_PAGE_SIZE", "50"))
+LOG_PAGE_MAX  = int(os.getenv("LOG_PAGE_MAX", "500"))
+
+
 @app.route("/log")
 def log():
-    if not os.path.exists(RESPONSES_FILE):
-        return jsonify({"entries": []})
-    with open(RESPONSES_FILE, "r") as f:
-        entries = [line.strip() for line in f.readlines() if line.strip()]
-    return jsonify({"entries": entries})
-
+    """
+    Logged IVR outcomes and appointments, newest first.
+    Query: ?limit=&cursor=&patient=&language=&outcome=&from=&to=
+    (outcome is one of LOG_OUTCOMES; from/to are YYYY-MM-DD or
+    "YYYY-MM-DD HH:MM:SS"). Pass next_cursor back as cursor for the next page.
+    """
+    args = request.args
+    try:
+        limit  = max(1, min(int(args.get("limit", LOG_PAGE_SIZE)), LOG_PAGE_MAX))
+        cursor = int(args["cursor"]) if args.get("cursor") else None
+        since  = parse_log_time(args["from"]) if args.get("from") else None
+        until  = parse_log_time(args["to"], end=True) if args.get("to") else None
+    except ValueError:
+        return jsonify({"error": "limit/cursor must be integers, from/to dates as YYYY-MM-DD"}), 400
+    outcome = args.get("outcome") or None
+    if outcome and outcome not in LOG_OUTCOMES:
+        return jsonify({"error": f"outcome must be one of {', '.join(LOG_OUTCOMES)}"}), 400
+
+    filters = {"patient": args.get("patient"), "language": args.get("language"), "outcome": outcome}
+    if EVENTS_BACKEND == "sqlite":
+        rows, next_cursor = event_store.query(
+            since=format_log_time(since) if since is not None else None,
+            until=format_log_time(until) if until is not None else None,
+            before=cursor, limit=limit, **filters)
+        entries = [render_line(row) for row in rows]
+    else:
+        entries, next_cursor = responses_index.query(since=since, until=until, before=cursor,
+                                                     limit=limit, **filters)
+    return jsonify({"entries": entries, "next_cursor": next_cursor})
 
 
 # ─────────────────────────────────────────────
@@ -758,7 +2557,11 @@ def spa_analyze():
     """
     Vitals analysis for the static SPA.
     Expects JSON: {blood_pressure_systolic, blood_pressure_diastolic,
-                   blood_sugar, bmi, temperature, patient_name, language}
+                   blood_sugar, bmi, temperature, patient_name, language,
+                   patient_id?, surgery_type?, include_text?}
+    History is kept under patient_id, or this browser session's patient.
+    Returns {severity, issues, emergency, alert} and, unless include_text
+    is false, the rendered summary as `message`.
     """
     data = request.get_json(silent=True) or {}
 
@@ -771,30 +2574,165 @@ def spa_analyze():
         "oxygen_level":    data.get("oxygen_level", 0),
     }
 
-    summary = analyze_vitals(vitals)
-
-    # Derive severity from the summary text
-    if "⚠️" in summary and "DOCTOR ALERT" not in summary:
-        severity = "moderate"
-        emergency = False
-    elif "condition worsened" in summary.lower() or "🚨" in summary:
-        severity = "high"
-        emergency = True
-    elif "✅" in summary:
-        severity = "low"
-        emergency = False
-    else:
-        severity = "moderate"
-        emergency = False
+    report = analyze_vitals(vitals, data.get("surgery_type", ""))
+    record_vitals(vitals_patient_key(data.get("patient_id"), data.get("patient_name")), report)
+    result = {
+        "severity":  report.severity,
+        "issues":    report.issues,
+        "trends":    [flag for flag, _ in report.trends],
+        "emergency": report.emergency,
+        "alert":     report.emergency,
+    }
+    # Summary text is only rendered for clients that display it
+    if data.get("include_text", True):
+        result["message"] = report.text()
+    return jsonify(result)
+
+
+@app.route("/vitals/history")
+def vitals_history():
+    """
+    Rolling-window view of a patient's recorded vitals.
+    Query: ?patient_id=.. or ?patient_name=.. (the name only selects among
+    patients recorded from this browser session; default: the session
+    patient), &hours=48 (default VITALS_TREND_HOURS). Returns per-vital
+    {count, mean, min, max, slope_per_day} plus any trend flags.
+    """
+    patient_id   = request.args.get("patient_id")
+    patient_name = request.args.get("patient_name") or session.get("patient_name", "")
+    patient_key  = vitals_patient_key(patient_id, patient_name)
+    try:
+        hours = float(request.args.get("hours", VITALS_TREND_HOURS))
+    except ValueError:
+        return jsonify({"error": "hours must be numeric"}), 400
 
+    try:
+        stats  = vitals_store.stats(patient_key, hours)
+        trends = vitals_store.trend_flags(patient_key, hours)
+    except ImportError:
+        return jsonify({"error": "Vitals history requires NumPy on the server"}), 501
     return jsonify({
-        "severity": severity,
-        "message":  summary,
-        "emergency": emergency,
-        "alert":    emergency,
+        "patient_id":   patient_id,
+        "patient_name": None if patient_id else patient_name,
+        "readings":     vitals_store.count(patient_key),
+        "window_hours": hours,
+        "vitals":       stats,
+        "trends":       [{"flag": flag, "text": text} for flag, text in trends],
     })
 
 
+@app.route("/vitals/stream", methods=["POST"])
+def vitals_stream():
+    """
+    Continuous bedside-device ingestion (NDJSON, chunked upload welcome).
+    Each line: {patient_name, patient_id?, temperature?, blood_pressure? |
+    blood_pressure_systolic? + blood_pressure_diastolic?, heart_rate?,
+    blood_sugar?, oxygen_level?, surgery_type?, ts?}. Send patient_id: only
+    samples with one are added to the vitals history, and alert windows are
+    kept per patient_id. Samples without one are grouped by patient_name, so
+    every device streaming the same name shares one window. ts (epoch
+    seconds) must not run backwards per patient or lie in the future; such
+    samples get an error event and are dropped.
+    Samples are processed as they arrive; the response
+    streams NDJSON alert/clear/error events back as soon as they happen and
+    ends with a {"event": "done"} summary.
+    """
+    default_surgery = request.args.get("surgery_type", "")
+    body = request.stream
+
+    def generate():
+        processed = alerts = 0
+        for line_no, raw in enumerate(iter(lambda: body.readline(VITALS_STREAM_MAX_LINE), b""), 1):
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                sample = json.loads(raw)
+                patient = str(sample["patient_name"])
+            except (ValueError, KeyError, TypeError):
+                yield json.dumps({"event": "error", "line": line_no,
+                                  "error": "Expected a JSON object with patient_name"}) + "\n"
+                continue
+
+            readings, _ = parse_vitals(stream_sample_vitals(sample))
+            patient_id  = str(sample.get("patient_id") or "").strip()
+            patient_key = vitals_patient_key(patient_id) if patient_id else None
+            if VITALS_HISTORY and patient_key:
+                try:
+                    ts = float(sample["ts"]) if sample.get("ts") is not None else None
+                    vitals_store.append(patient_key, readings, ts)
+                except (ValueError, TypeError) as e:
+                    yield json.dumps({"event": "error", "line": line_no, "error": f"Rejected ts: {e}"}) + "\n"
+                    continue
+                except OSError as e:
+                    print(f"[WARN] Vitals history unavailable: {e}")
+            processed += 1
+            vitals_stream_events.inc("sample")
+
+            event = vitals_monitor.observe(patient_key or f"name:{patient}", patient, readings,
+                                           sample.get("surgery_type", default_surgery))
+            if event:
+                alerts += event["event"] == "alert"
+                vitals_stream_events.inc(event["event"])
+                event["line"] = line_no
+                if patient_id:
+                    event["patient_id"] = patient_id
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        yield json.dumps({"event": "done", "processed": processed, "alerts": alerts}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/analyze/batch", methods=["POST"])
+def spa_analyze_batch():
+    """
+    Vectorised vitals analysis for ward monitors.
+    Expects JSON columns of equal length: {temperature, blood_pressure_systolic,
+    blood_pressure_diastolic, heart_rate, blood_sugar, oxygen_level, patient_ids?}
+    plus an optional surgery_type (one procedure, or one per patient).
+    Returns per-patient issue codes and severity, without summary text.
+    """
+    data    = request.get_json(silent=True) or {}
+    columns = {name: data[name] for name in VITALS_BATCH_FIELDS if data.get(name) is not None}
+    if not columns:
+        return jsonify({"error": "No vitals provided"}), 400
+
+    lengths = {len(col) if isinstance(col, list) else -1 for col in columns.values()}
+    if len(lengths) != 1 or -1 in lengths:
+        return jsonify({"error": "Vitals must be arrays of equal length"}), 400
+    count = lengths.pop()
+    if count > VITALS_BATCH_MAX:
+        return jsonify({"error": f"Too many readings (max {VITALS_BATCH_MAX})"}), 413
+
+    surgery_type = data.get("surgery_type", "")
+    if isinstance(surgery_type, list):
+        if len(surgery_type) != count:
+            return jsonify({"error": "surgery_type list must match the vitals length"}), 400
+        if not all(p is None or isinstance(p, str) for p in surgery_type):
+            return jsonify({"error": "surgery_type entries must be strings or null"}), 400
+        surgery_type = [p or "" for p in surgery_type]
+    elif surgery_type is not None and not isinstance(surgery_type, str):
+        return jsonify({"error": "surgery_type must be a string or a list of strings"}), 400
+
+    try:
+        masks = analyze_vitals_batch(columns, surgery_type)
+    except ImportError:
+        return jsonify({"error": "Batch analysis requires NumPy on the server"}), 501
+    except (ValueError, TypeError):
+        return jsonify({"error": "Vitals must be numeric"}), 400
+
+    masks  = masks.tolist()
+    result = {
+        "count":    count,
+        "issues":   [issue_codes(m) for m in masks],
+        "severity": ["moderate" if m else "low" for m in masks],
+    }
+    if isinstance(data.get("patient_ids"), list) and len(data["patient_ids"]) == count:
+        result["patient_ids"] = data["patient_ids"]
+    return jsonify(result)
+
+
 @app.route("/postop-chat", methods=["POST"])
 def spa_postop_chat():
     """
@@ -815,12 +2753,11 @@ def spa_postop_chat():
     session["surgery_type"] = surgery_type
     session["language"]     = language
 
-    response_text = ask_llm(message)
-
-    # Basic severity detection from response keywords
-    alert_keywords = ["🚨", "call 108", "emergency", "immediately", "seek care", "doctor now"]
-    is_emergency   = any(kw in response_text.lower() for kw in alert_keywords)
-    severity       = "high" if is_emergency else ("moderate" if "⚠️" in response_text else "low")
+    try:
+        response_text = ask_llm(message, conversation_id=conversation_key(patient_name))
+    except LLMSaturated:
+        return llm_busy_response()
+    severity, is_emergency = reply_severity(response_text)
 
     return jsonify({
         "response_text": response_text,
@@ -829,11 +2766,134 @@ def spa_postop_chat():
     })
 
 
+@app.route("/postop-chat/stream", methods=["POST"])
+def spa_postop_chat_stream():
+    """
+    Streaming variant of /postop-chat (Server-Sent Events).
+    Emits {"delta": ...} events, then a final "done" event carrying
+    {severity, alert} for the full reply.
+    """
+    data = request.get_json(silent=True) or {}
+    message = data.get("message", "").strip()
+    if not message:
+        return jsonify({"error": "No message provided"}), 400
+
+    session["patient_name"] = data.get("patient_name", "Patient")
+    session["surgery_type"] = data.get("surgery_type", "")
+    session["language"]     = data.get("language", "English")
+    conversation_id = conversation_key(session["patient_name"])
+
+    def generate():
+        parts = []
+        for delta in ask_llm_stream(message, conversation_id):
+            parts.append(delta)
+            yield sse_event({"delta": delta})
+        severity, is_emergency = reply_severity("".join(parts))
+        yield sse_event({"severity": severity, "alert": is_emergency}, event="done")
+
+    return sse_response(generate())
+
+
+BATCH_MAX_ITEMS   = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))     # in-flight items per request
+BATCH_WORKERS     = int(os.getenv("BATCH_WORKERS", "32"))         # shared by every batch request
+
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+
+
+def _answer_batch_item(message: str, patient_name: str, surgery_type: str, language: str) -> dict:
+    try:
+        response_text = ask_llm(message, patient_name, surgery_type, language)
+    except Exception as e:
+        print(f"[WARN] Batch item failed, using keyword fallback: {e}")
+        response_text = fallback_reply(message, patient_name)
+    severity, is_emergency = reply_severity(response_text)
+    return {
+        "response_text": response_text,
+        "severity":      severity,
+        "alert":         is_emergency,
+    }
+
+
+@app.route("/postop-chat/batch", methods=["POST"])
+def spa_postop_chat_batch():
+    """
+    Batch variant of /postop-chat for nurse-station tooling.
+    Expects JSON: {items: [{message, patient_name, surgery_type, language}, ...]}
+    Items are answered concurrently, at most BATCH_CONCURRENCY per request
+    on a pool of BATCH_WORKERS shared by all batches, so one large batch
+    can't queue the others behind it. Results come back in request order;
+    a failed item degrades to the keyword fallback.
+    """
+    data  = request.get_json(silent=True) or {}
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "No items provided"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Too many items (max {BATCH_MAX_ITEMS})"}), 413
+
+    futures   = []
+    in_flight = threading.BoundedSemaphore(BATCH_CONCURRENCY)
+    for item in items:
+        item    = item if isinstance(item, dict) else {}
+        message = str(item.get("message", "")).strip()
+        if not message:
+            futures.append(None)
+            continue
+        in_flight.acquire()
+        futures.append(_batch_executor.submit(
+            _answer_batch_item, message,
+            # Explicit strings: ask_llm() must not fall back to `session` on a worker thread
+            str(item.get("patient_name") or "Patient"),
+            str(item.get("surgery_type") or ""),
+            str(item.get("language") or "English"),
+        ))
+        futures[-1].add_done_callback(lambda _: in_flight.release())
+
+    results = [f.result() if f is not None else {"error": "No message provided"}
+               for f in futures]
+    return jsonify({"results": results})
+
+
+@app.route("/availability")
+def availability():
+    """
+    Free appointment slots from the per-doctor bitmaps.
+    Query: ?doctor=… or ?specialty=… (neither → every doctor),
+           &after=YYYY-MM-DD[ HH:MM] (default now), &days=7, &limit=100,
+           &earliest=1 to return only the first free slot.
+    """
+    args = request.args
+    try:
+        days  = max(1, min(int(args.get("days", 7)), AVAILABILITY_MAX_DAYS))
+        limit = 1 if args.get("earliest") in ("1", "true") else max(1, min(int(args.get("limit", 100)), 1000))
+        now   = time.localtime()
+        after = slot_minute(time.strftime("%Y-%m-%d", now), time.strftime("%H:%M", now))
+        if args.get("after"):
+            date, _, clock = args["after"].strip().partition(" ")
+            after = max(after, slot_minute(date, clock or "00:00"))
+    except ValueError:
+        return jsonify({"error": "after must be YYYY-MM-DD[ HH:MM]; days/limit integers"}), 400
+
+    doctors = doctors_matching(args.get("doctor", ""), args.get("specialty", ""))
+    if not doctors:
+        return jsonify({"error": "No doctor matches that specialty"}), 404
+    slots = [dict(slot_label(minute), doctor=doctor)
+             for minute, doctor in appointment_book.availability(doctors, after, days, limit)]
+    return jsonify({
+        "slot_minutes": APPOINTMENT_MINUTES,
+        "doctors":      doctors,
+        "slots":        slots,
+    })
+
+
 @app.route("/book-appointment", methods=["POST"])
 def spa_book_appointment():
     """
     Appointment booking for the static SPA.
     Expects JSON: {patient_name, doctor, date, time, language}
+    A slot already taken for that doctor returns 409 with the nearest free
+    alternatives ([{date, time}]).
     """
     data         = request.get_json(silent=True) or {}
     patient_name = data.get("patient_name", "Patient")
@@ -845,13 +2905,18 @@ def spa_book_appointment():
     if not doctor or not date or not time_val:
         return jsonify({"error": "Missing required fields"}), 400
 
-    # Log the appointment to responses.txt
-    import datetime as _dt
-    timestamp = _dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    entry = (f"[{timestamp}] APPOINTMENT | Patient: {patient_name} | "
-             f"Doctor: {doctor} | Date: {date} | Time: {time_val} | Lang: {language}\n")
-    with open(RESPONSES_FILE, "a") as f:
-        f.write(entry)
+    try:
+        booked, alternatives = appointment_book.book(patient_name, doctor, date, time_val, language)
+    except PastSlotError:
+        return jsonify({"error": f"{date} at {time_val} is in the past; please choose a later slot."}), 400
+    except ValueError:
+        return jsonify({"error": "date must be YYYY-MM-DD and time HH:MM"}), 400
+    if not booked:
+        return jsonify({
+            "status":       "conflict",
+            "error":        f"{doctor} is already booked on {date} at {time_val}.",
+            "alternatives": alternatives,
+        }), 409
 
     return jsonify({
         "status": "success",
@@ -862,38 +2927,14 @@ def spa_book_appointment():
 @app.route("/customer-care-call", methods=["POST"])
 def spa_customer_care_call():
     """
-    Launch the offline IVR system for the SPA's 'Call Customer Care' button.
+    Start a follow-up call for the SPA's 'Call Customer Care' button.
     Expects JSON: {patient_name, language}
     """
     data         = request.get_json(silent=True) or {}
     patient_name = data.get("patient_name", "Patient")
     language     = data.get("language", "English")
-    ivr_script   = os.path.join(BASE_DIR, "offline_ivr.py")
-
-    try:
-        terminal_cmds = [
-            ["gnome-terminal", "--", sys.executable, ivr_script, patient_name, language],
-            ["xterm",          "-e", f'{sys.executable} "{ivr_script}" "{patient_name}" "{language}"'],
-            ["x-terminal-emulator", "-e", f'{sys.executable} "{ivr_script}" "{patient_name}" "{language}"'],
-        ]
-        launched = False
-        for cmd in terminal_cmds:
-            try:
-                subprocess.Popen(cmd, cwd=BASE_DIR)
-                launched = True
-                break
-            except FileNotFoundError:
-                continue
-
-        if not launched:
-            subprocess.Popen([sys.executable, ivr_script, patient_name, language], cwd=BASE_DIR)
-
-        return jsonify({
-            "status": "success",
-            "message": f"Follow-up call initiated for {patient_name}!"
-        })
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+    return start_ivr_call(patient_name, language, f"Follow-up call initiated for {patient_name}!",
+                          mode=IVR_CARE_MODE)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: /availability-style searches over the per-day free-slot
+bitmaps vs probing every clinic-grid slot with the interval index, for
+hundreds of doctors with months of mostly-booked calendar.
+Usage: python3 benchmarks/bench_availability.py [doctors] [days] [booked fraction]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def probe_free_slots(sched, after, days):
+    """The naive way: test every grid slot with DoctorSchedule.conflicts()."""
+    first_day = after // 1440
+    for day in range(first_day, first_day + days):
+        for k in range(app.CLINIC_SLOTS):
+            start = day * 1440 + app.CLINIC_OPEN_MINUTE + k * app.APPOINTMENT_MINUTES
+            if start >= after and not sched.conflicts(start, start + app.APPOINTMENT_MINUTES):
+                yield start
+
+
+def timed(label, fn, rounds=50):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    print(f"{label:<50} {(time.perf_counter() - start) / rounds * 1e3:8.3f} ms")
+    return result
+
+
+def main():
+    doctors = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    days    = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+    booked  = float(sys.argv[3]) if len(sys.argv) > 3 else 0.9
+    rng = random.Random(3)
+    first_day = app.slot_minute("2030-01-01", "00:00") // 1440
+
+    schedules = {}
+    for d in range(doctors):
+        sched = app.DoctorSchedule()
+        for day in range(first_day, first_day + days):
+            for k in range(app.CLINIC_SLOTS):
+                if rng.random() < booked:
+                    start = day * 1440 + app.CLINIC_OPEN_MINUTE + k * app.APPOINTMENT_MINUTES
+                    sched.add(start, start + app.APPOINTMENT_MINUTES)
+        schedules[f"Dr. {d}"] = sched
+    print(f"{doctors} doctors x {days} days, {booked:.0%} booked\n")
+
+    after = first_day * 1440 + 600
+    cardiologists = list(schedules.values())[: doctors // 5]
+
+    def earliest(slot_iter):
+        return min((next(slot_iter(s), None) for s in cardiologists), key=lambda m: m or float("inf"))
+
+    a = timed(f"earliest slot, {len(cardiologists)} doctors, bitmaps",
+              lambda: earliest(lambda s: s.free_slots(after, days)))
+    b = timed(f"earliest slot, {len(cardiologists)} doctors, probing",
+              lambda: earliest(lambda s: probe_free_slots(s, after, days)))
+    one = schedules["Dr. 0"]
+    c = timed("all free slots for one doctor, 7 days, bitmaps", lambda: list(one.free_slots(after, 7)))
+    d = timed("all free slots for one doctor, 7 days, probing", lambda: list(probe_free_slots(one, after, 7)))
+    e = timed("all free slots, every doctor, 120 days, bitmaps",
+              lambda: sum(1 for s in schedules.values() for _ in s.free_slots(after, days)), rounds=3)
+    f = timed("all free slots, every doctor, 120 days, probing",
+              lambda: sum(1 for s in schedules.values() for _ in probe_free_slots(s, after, days)), rounds=3)
+    print(f"\nresults agree: {a == b and c == d and e == f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: many processes x threads appending responses.txt-style
+lines, comparing the old open/append/close per line (with and without
+fsync) against the group-commit EventLog under each fsync policy. Also
+verifies no line was lost or torn.
+Usage: python3 benchmarks/bench_event_log.py [processes] [threads] [lines per thread]
+"""
+
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_log import EventLog  # noqa: E402
+
+LINE = re.compile(r"^\[\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\] Patient: P\d+-T\d+ \| Language: English "
+                  r"\| Option: 1 \| Outcome: Feeling fine #\d+$")
+
+
+def line_for(proc, thread, i):
+    return (f"[2026-01-01 10:00:00] Patient: P{proc}-T{thread} | Language: English "
+            f"| Option: 1 | Outcome: Feeling fine #{i}\n")
+
+
+def worker(path, mode, proc, threads, lines):
+    log = None if mode.endswith("per-line") else EventLog(path, fsync=mode)
+
+    def run(thread):
+        for i in range(lines):
+            if log is None:
+                with open(path, "a") as f:
+                    f.write(line_for(proc, thread, i))
+                    if mode == "fsync-per-line":
+                        f.flush()
+                        os.fsync(f.fileno())
+            else:
+                log.append(line_for(proc, thread, i))
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    if log is not None:
+        log.close()
+
+
+def bench(mode, processes, threads, lines):
+    path = os.path.join(tempfile.mkdtemp(prefix="eventlog-bench-"), "responses.txt")
+    start = time.perf_counter()
+    procs = [multiprocessing.Process(target=worker, args=(path, mode, p, threads, lines))
+             for p in range(processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    with open(path) as f:
+        written = f.read().splitlines()
+    expected = processes * threads * lines
+    torn = sum(1 for line in written if not LINE.match(line))
+    print(f"{mode:<14} {expected / elapsed:9.0f} lines/s  ({elapsed:5.2f} s)  "
+          f"lines {len(written)}/{expected}, torn {torn}")
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads   = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    lines     = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    print(f"{processes} processes x {threads} threads x {lines} lines\n")
+    for mode in ("open-per-line", "never", "interval", "fsync-per-line", "always"):
+        durable = mode in ("fsync-per-line", "always")
+        bench(mode, processes, threads, max(1, lines // 10) if durable else lines)
+
+
+if __name__ == "__main__":
+    main()
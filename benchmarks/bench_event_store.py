@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the SQLite event store: streaming import of a synthetic
+responses.txt (both IVR formats plus appointments), per-event insert
+throughput from concurrent writer threads (one autocommit INSERT each, as
+the app and IVR do), and /log-style filtered page queries.
+Usage: python3 benchmarks/bench_event_store.py [log lines] [writer threads] [inserts per thread]
+"""
+
+import datetime
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import EventStore  # noqa: E402
+
+LANGUAGES = ["English", "Hindi", "Telugu"]
+
+
+def synthetic_log(path, count, seed=5):
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 1, 1)
+    with open(path, "w") as f:
+        for i in range(count):
+            ts = (start + datetime.timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+            patient = f"Patient {rng.randint(1, 5000)}"
+            kind = rng.random()
+            if kind < 0.1:
+                f.write(f"[{ts}] APPOINTMENT | Patient: {patient} | Doctor: Dr. {rng.randint(1, 40)} | "
+                        f"Date: 2025-06-0{rng.randint(1, 9)} | Time: 10:30 | Lang: {rng.choice(LANGUAGES)}\n")
+            elif kind < 0.3:
+                f.write(f"[{ts}] Patient: {patient} | Option: {rng.randint(1, 3)} | Outcome: legacy line\n")
+            else:
+                f.write(f"[{ts}] Patient: {patient} | Language: {rng.choice(LANGUAGES)} | "
+                        f"Option: {rng.randint(1, 3)} | Outcome: outcome text\n")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    lines   = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    inserts = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    workdir = tempfile.mkdtemp(prefix="eventstore-bench-")
+    log_path = os.path.join(workdir, "responses.txt")
+    store = EventStore(os.path.join(workdir, "events.db"))
+
+    synthetic_log(log_path, lines)
+    start = time.perf_counter()
+    imported = store.import_log(log_path)
+    elapsed = time.perf_counter() - start
+    print(f"import:  {imported} events in {elapsed:.2f} s ({imported / elapsed / 1e3:.0f} k/s)")
+
+    def writer(n):
+        for i in range(inserts):
+            if i % 5:
+                store.record_ivr(f"Writer {n}", "English", str(i % 3 + 1), "outcome text")
+            else:
+                store.record_appointment(f"Writer {n}", "Dr. 1", "2025-06-01", "10:30", "English")
+
+    pool = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(f"insert:  {threads} threads x {inserts} events in {elapsed:.2f} s "
+          f"({threads * inserts / elapsed:.0f} events/s)\n")
+
+    queries = {
+        "latest page":              {},
+        "patient":                  {"patient": "patient 42"},
+        "outcome + language":       {"outcome": "worsened", "language": "telugu"},
+        "date range":               {"since": "2025-03-01", "until": "2025-03-02"},
+        "patient + date range":     {"patient": "patient 42", "since": "2025-02-01", "until": "2025-08-01"},
+    }
+    for label, filters in queries.items():
+        samples = []
+        for _ in range(200):
+            t0 = time.perf_counter()
+            rows, cursor = store.query(limit=50, **filters)
+            samples.append((time.perf_counter() - t0) * 1e3)
+        print(f"query {label:<22} p50 {percentile(samples, 50):6.2f} ms  p99 {percentile(samples, 99):6.2f} ms  "
+              f"({len(rows)} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: the original if-chain keyword fallback vs the compiled
+IntentMatcher behind app.fallback_reply(), on a synthetic corpus of
+English / Hindi / Telugu patient messages. Also checks both give the
+same reply for every message.
+Usage: python3 benchmarks/bench_intent_matcher.py [messages]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+FILLER = {
+    "English": "i feel very after my surgery the and since yesterday morning night it is a bit "
+               "really bad still worried about doctor said home today".split(),
+    "Hindi":   "मुझे बहुत कल से सर्जरी के बाद रात को थोड़ा है और डॉक्टर ने कहा".split(),
+    "Telugu":  "నాకు చాలా నిన్నటి నుండి సర్జరీ తర్వాత రాత్రి కొంచెం ఉంది డాక్టర్ చెప్పారు".split(),
+}
+
+
+# Verbatim copy of the keyword chain that used to live in ask_llm()
+def legacy_fallback(message: str, name: str = "") -> str:
+    # ── Smart Conversational Fallback ─────────────────────────────────
+    msg = message.lower().strip()
+    greeting_name = f", {name}" if name else ""
+
+    # Greetings
+    greetings = ["hi", "hello", "hey", "hii", "helo", "howdy", "namaste",
+                 "नमस्ते", "నమస్కారం", "good morning", "good evening",
+                 "good afternoon", "good night", "sup", "yo"]
+    if any(msg == g or msg.startswith(g + " ") for g in greetings):
+        return (
+            f"Hello{greeting_name}! 👋 I'm MedFollow AI, your personal health assistant. "
+            "I'm here to help you with any symptoms, recovery questions, or medication concerns. "
+            "How are you feeling today? Please describe what's going on and I'll guide you."
+        )
+
+    # How are you
+    if any(p in msg for p in ["how are you", "how r u", "are you ok", "kaise ho", "ela unnav"]):
+        return (
+            f"I'm doing great, thank you{greeting_name}! 😊 More importantly — how are YOU feeling? "
+            "Tell me about any symptoms or concerns and I'll provide guidance right away."
+        )
+
+    # Who are you / what can you do
+    if any(p in msg for p in ["who are you", "what are you", "what can you do",
+                               "tell me about yourself", "aap kaun"]):
+        return (
+            "I'm MedFollow AI 🏥 — your hospital follow-up health assistant. I can help with:\n"
+            "• Post-surgery recovery questions\n"
+            "• Symptom assessment (fever, pain, swelling, etc.)\n"
+            "• Medication and wound care guidance\n"
+            "• Vital sign interpretation\n\n"
+            "Just describe your symptoms and I'll give you personalised guidance!"
+        )
+
+    # Help / menu
+    if any(p in msg for p in ["help", "options", "menu", "help me", "सहायता", "సహాయం"]):
+        return (
+            "Sure! Here's what you can ask me about:\n\n"
+            "🌡️ Fever / Temperature\n"
+            "💊 Pain or Discomfort\n"
+            "💓 Blood Pressure / Heart Rate\n"
+            "🩸 Blood Sugar / Diabetes\n"
+            "😮‍💨 Breathing Difficulty\n"
+            "🤢 Nausea / Dizziness\n"
+            "🩹 Wound / Incision Care\n"
+            "💤 Fatigue / Sleep Issues\n"
+            "💉 Medication Questions\n\n"
+            "Just type your symptom and I'll guide you!"
+        )
+
+    # Thank you
+    if any(p in msg for p in ["thank", "thanks", "thank you", "ty", "dhanyavad",
+                               "ధన్యవాదాలు", "धन्यवाद"]):
+        return (
+            f"You're very welcome{greeting_name}! 😊 "
+            "If anything feels urgent, don't hesitate to call 108 or contact your doctor directly. "
+            "Take good care and feel better soon!"
+        )
+
+    # OK / fine
+    if msg in ["ok", "okay", "fine", "alright", "got it", "understood", "k", "sure"]:
+        return (
+            "Glad to hear that! 😊 Feel free to ask me anything else. "
+            "If new symptoms appear or anything changes, just let me know."
+        )
+
+    # Fever
+    if any(w in msg for w in ["fever", "temperature", "hot", "burning", "chills",
+                               "बुखार", "तापमान", "జ్వరం", "ఉష్ణోగ్రత"]):
+        return (
+            "🌡️ A fever can be your body fighting infection. Here's what to do:\n\n"
+            "• Stay well hydrated — drink water, ORS, or coconut water every hour\n"
+            "• Rest completely; avoid physical exertion\n"
+            "• Take paracetamol (as prescribed) to bring it down\n"
+            "• Apply a cool damp cloth on your forehead\n\n"
+            "⚠️ Call your doctor immediately if: temperature exceeds 103°F (39.4°C), "
+            "fever lasts more than 48 hours, or is accompanied by severe headache or rash."
+        )
+
+    # Pain
+    if any(w in msg for w in ["pain", "ache", "hurt", "sore", "cramp",
+                               "दर्द", "నొప్పి"]):
+        return (
+            "💊 Pain management after surgery or illness:\n\n"
+            "• Note the location and rate your pain (1 = mild, 10 = severe)\n"
+            "• Take your prescribed pain medication on schedule, don't skip doses\n"
+            "• Apply a warm compress for muscle aches, cold pack for swelling\n\n"
+            "⚠️ Seek care immediately if: pain is sudden and severe (8–10/10), "
+            "pain is spreading, or accompanied by fever or swelling."
+        )
+
+    # Breathing
+    if any(w in msg for w in ["breathe", "breathing", "breath", "shortness",
+                               "oxygen", "chest", "सांस", "ఊపిరి"]):
+        return (
+            "😮‍💨 Breathing difficulty needs immediate attention:\n\n"
+            "• Sit upright — don't lie flat\n"
+            "• Breathe in slowly through your nose, out through your mouth\n"
+            "• Loosen any tight clothing around your chest\n\n"
+            "🚨 Call 108 immediately if: SpO₂ drops below 94%, "
+            "you feel chest tightness, or you cannot speak full sentences."
+        )
+
+    # Dizziness / Nausea
+    if any(w in msg for w in ["dizzy", "dizziness", "faint", "nausea", "nauseous",
+                               "vomit", "vomiting", "lightheaded", "चक्कर", "మైకం"]):
+        return (
+            "🤢 Dizziness or nausea is common after surgery or medication changes:\n\n"
+            "• Sit or lie down immediately to prevent a fall\n"
+            "• Sip cold water slowly — small sips, not large gulps\n"
+            "• Avoid sudden head movements or standing up too quickly\n"
+            "• Eat small, bland meals (rice, toast, bananas)\n\n"
+            "⚠️ See your doctor if: nausea persists over 6 hours or you cannot keep fluids down."
+        )
+
+    # Swelling
+    if any(w in msg for w in ["swelling", "swollen", "puffiness", "edema",
+                               "सूजन", "వాపు"]):
+        return (
+            "🦵 Post-surgical swelling management:\n\n"
+            "• Elevate the swollen area above heart level when resting\n"
+            "• Apply an ice pack wrapped in cloth: 20 min on, 20 min off\n"
+            "• Reduce salt intake to prevent fluid retention\n\n"
+            "⚠️ See your doctor today if: swelling is red, warm, or spreading — "
+            "this may indicate infection or a blood clot."
+        )
+
+    # Wound
+    if any(w in msg for w in ["wound", "incision", "cut", "stitches", "suture",
+                               "bleed", "bleeding", "pus", "घाव", "గాయం"]):
+        return (
+            "🩹 Wound care essentials:\n\n"
+            "• Keep the wound clean and dry at all times\n"
+            "• Change dressings on schedule; don't remove stitches yourself\n"
+            "• Do NOT use hydrogen peroxide unless prescribed\n\n"
+            "🚨 Go to your doctor immediately if: you notice increased redness, warmth, "
+            "swelling, foul odor, yellow/green discharge, or if bleeding won't stop."
+        )
+
+    # Blood sugar
+    if any(w in msg for w in ["sugar", "glucose", "diabetes", "insulin",
+                               "शर्करा", "చక్కెర"]):
+        return (
+            "🩸 Blood sugar control during recovery:\n\n"
+            "• Continue your prescribed diabetes medications — do NOT stop them\n"
+            "• Eat regular small meals; avoid skipping meals\n"
+            "• Target fasting blood sugar: 80–130 mg/dL\n\n"
+            "⚠️ Low sugar (<70 mg/dL) → eat glucose tablets or 3 teaspoons of sugar in water RIGHT NOW. "
+            "High sugar (>250) → contact your doctor today."
+        )
+
+    # Blood pressure
+    if any(w in msg for w in ["blood pressure", "bp", "hypertension", "hypotension",
+                               "pressure", "रक्तचाप", "రక్తపోటు"]):
+        return (
+            "💓 Blood pressure monitoring during recovery:\n\n"
+            "• Normal range: 90–120 / 60–80 mmHg\n"
+            "• Take your BP medications exactly as prescribed\n"
+            "• Reduce salt, processed foods, and caffeine\n\n"
+            "⚠️ Contact your doctor if BP is consistently above 140/90 or below 90/60. "
+            "Severe headache with high BP → emergency care."
+        )
+
+    # Fatigue / Sleep
+    if any(w in msg for w in ["tired", "fatigue", "weak", "weakness", "sleep",
+                               "insomnia", "exhausted", "थकान", "అలసట"]):
+        return (
+            "💤 Fatigue is very common after surgery or illness:\n\n"
+            "• Aim for 7–9 hours of sleep per night\n"
+            "• Take short, gentle walks to improve circulation\n"
+            "• Eat protein-rich foods (eggs, lentils, paneer) to support tissue repair\n"
+            "• Stay well hydrated\n\n"
+            "⚠️ See your doctor if weakness is getting worse or accompanied by chest pain."
+        )
+
+    # Medication
+    if any(w in msg for w in ["medicine", "medication", "tablet", "pill", "drug",
+                               "dose", "antibiotic", "दवा", "మందు"]):
+        return (
+            "💊 Medication guidance:\n\n"
+            "• Take all medications exactly as prescribed — don't skip or double doses\n"
+            "• Complete the full antibiotic course even if you feel better\n"
+            "• Avoid alcohol during medication\n\n"
+            "⚠️ Stop and call your doctor if you notice: skin rash, difficulty breathing, "
+            "swollen lips/throat, or severe stomach pain."
+        )
+
+    # Catchall
+    return (
+        f"I'd love to help you{greeting_name}! 😊 "
+        "Could you describe your symptoms in a bit more detail?\n\n"
+        "• Where exactly is the discomfort?\n"
+        "• When did it start?\n"
+        "• How severe is it (mild / moderate / severe)?\n\n"
+        "You can also open the **Health Overview** page to log your vitals for a full AI analysis."
+    )
+
+
+def synthetic_corpus(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    keywords = [kw for _, _, kws, _ in app.FALLBACK_INTENTS for kw in kws]
+    corpus = []
+    for _ in range(n):
+        words = rng.choices(FILLER[rng.choice(list(FILLER))], k=rng.randint(2, 14))
+        for _ in range(rng.choice([0, 1, 1, 1, 2])):
+            words.insert(rng.randint(0, len(words)), rng.choice(keywords))
+        msg = " ".join(words)
+        corpus.append(msg.upper() if rng.random() < 0.1 else msg)
+    return corpus
+
+
+def timed(label, fn, corpus):
+    t0 = time.perf_counter()
+    replies = [fn(msg, "Priya") for msg in corpus]
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<24} {elapsed * 1000:8.1f} ms   {elapsed / len(corpus) * 1e6:6.2f} µs/msg")
+    return replies
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    corpus = synthetic_corpus(n)
+    before = timed("before (if-chain)", legacy_fallback, corpus)
+    after  = timed("after  (IntentMatcher)", app.fallback_reply, corpus)
+    mismatches = sum(a != b for a, b in zip(before, after))
+    print(f"{n} messages, {mismatches} mismatching replies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Call-duration benchmark for the IVR prompts: the old serial speak() per
+phrase (synthesize, then play) against the pipelined speak_sequence(),
+which synthesizes phrase N+1 while phrase N plays. edge-tts and the audio
+player are simulated with fixed latencies so the numbers are repeatable;
+reports the total time and the silent gap before each prompt, both with a
+cold cache and with the static phrases already prebuilt.
+Usage: python3 benchmarks/bench_ivr_pipeline.py [synthesis seconds] [playback seconds]
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SYNTH = float(sys.argv[1]) if len(sys.argv) > 1 else 0.8
+PLAY  = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+CACHE_DIR = tempfile.mkdtemp(prefix="bench_tts_")
+os.environ["TTS_CACHE_DIR"]  = CACHE_DIR
+os.environ["TTS_BUNDLE_DIR"] = os.path.join(CACHE_DIR, "bundle")
+sys.modules["edge_tts"] = types.ModuleType("edge_tts")     # speak_edge() only checks it imports
+
+import offline_ivr  # noqa: E402
+
+plays = []
+
+
+async def fake_synthesize(text, voice, rate, pitch, out_path):
+    await asyncio.sleep(SYNTH)
+    with open(out_path, "wb") as f:
+        f.write(text.encode("utf-8"))
+
+
+def fake_play(path):
+    start = time.perf_counter()
+    time.sleep(PLAY)
+    plays.append((start, time.perf_counter()))
+    return True
+
+
+offline_ivr._edge_speak_async = fake_synthesize
+offline_ivr.play_file = fake_play
+offline_ivr.print = lambda *args, **kwargs: None
+
+
+def call_script(p, name):
+    """The phrases of one call in run_ivr()'s order (option 1 pressed)."""
+    opening = [p["greeting"].format(name=name), p["listen"], p["opt1"], p["opt2"], p["opt3"]]
+    closing = [p["resp_1"].format(name=name), p["closing"]]
+    return opening, closing
+
+
+def run(mode, prebuilt):
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    p = offline_ivr.get_p()
+    if prebuilt:
+        cfg = offline_ivr.EDGE_VOICES["English"]
+        for phrase_id in ("listen", "opt1", "opt2", "opt3", "resp_invalid", "closing"):
+            key = offline_ivr.tts_cache_key(p[phrase_id], cfg["voice"], cfg["rate"], cfg["pitch"])
+            offline_ivr.tts_cache_put(key, lambda out, t=p[phrase_id]: open(out, "wb").write(t.encode()))
+    plays.clear()
+    t0 = time.perf_counter()
+    for part in call_script(p, f"Patient {mode}"):
+        if mode == "serial":
+            for text in part:
+                offline_ivr.speak(text)
+        else:
+            offline_ivr.speak_sequence(part)
+    total = time.perf_counter() - t0
+    ends = [t0] + [end for _, end in plays[:-1]]
+    gaps = [start - prev for (start, _), prev in zip(plays, ends)]
+    return total, gaps
+
+
+def main():
+    print(f"simulated synthesis {SYNTH:.2f}s, playback {PLAY:.2f}s per phrase, 7 phrases per call")
+    print("(gaps: silence before each prompt; the 6th follows the keypad menu)\n")
+    for prebuilt in (False, True):
+        print("static phrases prebuilt" if prebuilt else "cold cache")
+        for mode in ("serial", "pipelined"):
+            total, gaps = run(mode, prebuilt)
+            print(f"  {mode:10s} total {total:6.2f}s   gaps " + " ".join(f"{g:4.2f}" for g in gaps))
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
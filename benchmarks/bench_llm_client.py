@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request OpenAI client construction vs the pooled client
+returned by app.get_llm_client(), against a local stub server.
+Usage: python3 benchmarks/bench_llm_client.py [requests]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stub_openai  # noqa: E402
+
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100)
+    return cuts[49] * 1000, cuts[98] * 1000
+
+
+def run(label, get_client, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        client = get_client()
+        client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": "I have a fever after surgery"}],
+            max_tokens=300,
+        )
+        samples.append(time.perf_counter() - t0)
+    p50, p99 = percentiles(samples)
+    print(f"{label:<28} p50={p50:7.2f} ms   p99={p99:7.2f} ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    server, base_url = stub_openai.start()
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    from openai import OpenAI
+    import app
+
+    run("before (client per call)", lambda: OpenAI(api_key="sk-bench", base_url=base_url), n)
+    run("after  (pooled client)", lambda: app.get_llm_client("sk-bench"), n)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
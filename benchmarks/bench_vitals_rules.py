@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: the original hand-written analyze_vitals() vs the
+precompiled VitalRuleEngine behind app.analyze_vitals(), on synthetic
+post-op readings. Times the structured VitalsReport, full summary rendering
+and bare mask evaluation, and checks the rendered text matches the old
+summary for every reading.
+Usage: python3 benchmarks/bench_vitals_rules.py [readings]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+# Verbatim copy of analyze_vitals() before the rule engine
+def legacy_analyze_vitals(vitals: dict) -> str:
+    """Generate a health summary from submitted vitals."""
+    issues = []
+    recommendations = []
+
+    try:
+        temp = float(vitals.get("temperature", 0))
+        if temp > 99.5:
+            issues.append(f"Elevated temperature ({temp}°F — possible fever)")
+            recommendations.append("Stay hydrated, rest, and monitor temperature every 4 hours.")
+        elif temp < 96.0 and temp > 0:
+            issues.append(f"Low temperature ({temp}°F — possible hypothermia risk)")
+            recommendations.append("Keep warm and consult your doctor.")
+    except (ValueError, TypeError):
+        pass
+
+    try:
+        bp = vitals.get("blood_pressure", "")
+        if "/" in str(bp):
+            systolic, diastolic = [int(x.strip()) for x in str(bp).split("/")]
+            if systolic > 140 or diastolic > 90:
+                issues.append(f"High blood pressure ({bp} mmHg — hypertension range)")
+                recommendations.append("Reduce salt intake, limit stress, and consult your physician.")
+            elif systolic < 90 or diastolic < 60:
+                issues.append(f"Low blood pressure ({bp} mmHg — hypotension range)")
+                recommendations.append("Increase fluid intake, rise slowly from sitting/lying positions.")
+    except (ValueError, TypeError):
+        pass
+
+    try:
+        hr = int(vitals.get("heart_rate", 0))
+        if hr > 100:
+            issues.append(f"Elevated heart rate ({hr} bpm — tachycardia)")
+            recommendations.append("Rest, avoid caffeine, and monitor. Seek care if above 120 bpm.")
+        elif hr < 60 and hr > 0:
+            issues.append(f"Low heart rate ({hr} bpm — bradycardia)")
+            recommendations.append("Rest and monitor. Contact doctor if you feel faint.")
+    except (ValueError, TypeError):
+        pass
+
+    try:
+        sugar = float(vitals.get("blood_sugar", 0))
+        if sugar > 180:
+            issues.append(f"High blood sugar ({sugar} mg/dL)")
+            recommendations.append("Reduce carbohydrate intake and follow your diabetes care plan.")
+        elif sugar < 70 and sugar > 0:
+            issues.append(f"Low blood sugar ({sugar} mg/dL — hypoglycemia)")
+            recommendations.append("Consume fast-acting carbohydrates (juice/glucose tablets) immediately.")
+    except (ValueError, TypeError):
+        pass
+
+    try:
+        spo2 = int(vitals.get("oxygen_level", 0))
+        if spo2 < 94 and spo2 > 0:
+            issues.append(f"Low oxygen saturation ({spo2}% — below normal range)")
+            recommendations.append("Sit upright, breathe slowly. If below 90%, seek emergency care immediately.")
+    except (ValueError, TypeError):
+        pass
+
+    if not issues:
+        return ("✅ All your vitals appear to be within normal ranges. "
+                "Keep up the great work! Continue your prescribed regimen, "
+                "stay hydrated, and get adequate rest. Your next follow-up looks positive.")
+
+    summary = f"⚠️ Health Analysis Summary — {len(issues)} concern(s) detected:\n\n"
+    for issue in issues:
+        summary += f"• {issue}\n"
+    summary += "\n📋 Recommendations:\n"
+    for rec in recommendations:
+        summary += f"• {rec}\n"
+    summary += "\nPlease share this report with your doctor at your next appointment."
+    return summary
+
+
+def synthetic_readings(count, seed=7):
+    """Form-shaped payloads: mostly normal, with abnormal and missing fields mixed in."""
+    rng = random.Random(seed)
+    readings = []
+    for _ in range(count):
+        vitals = {
+            "temperature":  f"{rng.uniform(95.0, 102.0):.1f}",
+            "blood_pressure": f"{rng.randint(80, 170)}/{rng.randint(50, 110)}",
+            "heart_rate":   str(rng.randint(45, 130)),
+            "blood_sugar":  f"{rng.uniform(55, 260):.0f}",
+            "oxygen_level": str(rng.randint(86, 100)),
+        }
+        for field in list(vitals):
+            if rng.random() < 0.1:
+                vitals[field] = ""
+        readings.append(vitals)
+    return readings
+
+
+def timed(label, fn, batch, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for vitals in batch:
+            fn(vitals)
+    elapsed = time.perf_counter() - start
+    total = len(batch) * rounds
+    print(f"{label:<34} {elapsed:7.2f} s  {total / elapsed / 1e3:8.0f} k readings/s")
+    return elapsed
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    distinct = min(total, 100_000)
+    batch = synthetic_readings(distinct)
+    rounds = max(1, total // distinct)
+
+    mismatches = sum(legacy_analyze_vitals(v) != app.analyze_vitals(v).text() for v in batch)
+    print(f"{distinct} distinct readings x {rounds} rounds, {mismatches} summary mismatches\n")
+
+    engine = app.DEFAULT_VITAL_ENGINE
+    legacy = timed("legacy analyze_vitals (text)", legacy_analyze_vitals, batch, rounds)
+    timed("analyze_vitals (report only)", app.analyze_vitals, batch, rounds)
+    timed("analyze_vitals().text()", lambda v: app.analyze_vitals(v).text(), batch, rounds)
+    rules = timed("parse_vitals + engine.evaluate", lambda v: engine.evaluate(app.parse_vitals(v)[0]), batch, rounds)
+
+    parsed = [app.parse_vitals(v)[0] for v in batch]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for readings in parsed:
+            engine.evaluate(readings)
+    evaluate = time.perf_counter() - start
+    print(f"{'engine.evaluate (pre-parsed)':<34} {evaluate:7.2f} s  {distinct * rounds / evaluate / 1e3:8.0f} k readings/s")
+    print(f"\nspeed-up vs legacy: {legacy / rules:.1f}x scoring, {legacy / evaluate:.1f}x pre-parsed")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
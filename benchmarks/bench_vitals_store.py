@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: VitalsStore append throughput and 48h trend-query latency
+for one patient with a long history (one reading a minute, so 1M readings
+is ~2 years). Compares the memory-mapped windowed query against loading
+the whole history file.
+Usage: python3 benchmarks/bench_vitals_store.py [readings]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import app  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(11)
+    store = app.VitalsStore(tempfile.mkdtemp(prefix="vitals-bench-"))
+    now = time.time()
+    start_ts = now - total * 60
+
+    start = time.perf_counter()
+    for i in range(total):
+        readings = (rng.uniform(97, 100), rng.uniform(110, 150), rng.uniform(70, 95),
+                    rng.uniform(60, 110), rng.uniform(80, 200), rng.uniform(92, 100))
+        store.append("Bench Patient", readings, start_ts + i * 60)
+    elapsed = time.perf_counter() - start
+    size_mb = os.path.getsize(store.path("Bench Patient")) / 1e6
+    print(f"append: {total} readings in {elapsed:.1f} s ({total / elapsed / 1e3:.0f} k/s), {size_mb:.0f} MB on disk")
+
+    windowed = []
+    for _ in range(200):
+        t0 = time.perf_counter()
+        store.trend_flags("Bench Patient", 48, now)
+        windowed.append((time.perf_counter() - t0) * 1e3)
+
+    dtype = np.dtype([("ts", "<f8")] + [(name, "<f8") for name in app.VITAL_SIGNALS])
+    full = []
+    for _ in range(20):
+        t0 = time.perf_counter()
+        rows = np.fromfile(store.path("Bench Patient"), dtype=dtype)
+        rows = rows[rows["ts"] >= now - 48 * 3600]
+        full.append((time.perf_counter() - t0) * 1e3)
+
+    print(f"48h trend query (memmap + bisect): p50 {percentile(windowed, 50):.2f} ms  p99 {percentile(windowed, 99):.2f} ms")
+    print(f"48h window by loading whole file:   p50 {percentile(full, 50):.2f} ms  p99 {percentile(full, 99):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Minimal OpenAI-compatible stub server for the MedFollow AI benchmarks.
+Answers POST /v1/chat/completions with a canned reply (JSON or SSE stream)
+after an optional artificial delay, over HTTP/1.1 keep-alive.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ("Please rest, stay hydrated and keep monitoring your temperature. "
+         "Contact your doctor if it rises above 103°F.")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self.server.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for word in REPLY.split(" "):
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0,
+                         "model": body.get("model", "stub"),
+                         "choices": [{"index": 0, "delta": {"content": word + " "},
+                                      "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+            return
+
+        payload = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0,
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": REPLY}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start(delay: float = 0.0):
+    """Start the stub on a free localhost port; returns (server, base_url)."""
+    handler = type("Handler", (_Handler,), {"delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.calls = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
@@ -0,0 +1,421 @@
+"""
+MedFollow AI — shared append-only event log (responses.txt)
+Used by app.py and every offline_ivr.py process. Concurrent writers in a
+process are group-committed: whoever finds no write in progress becomes
+the leader and writes every queued line with one write() (and at most one
+fsync) while the others wait for it. Writes take an exclusive flock on
+the file, so lines from separate processes never interleave.
+
+Fsync policy (EVENT_LOG_FSYNC):
+  always   — fsync every group commit before callers return
+  interval — fsync at most every EVENT_LOG_FSYNC_INTERVAL seconds (default)
+  never    — leave flushing to the OS
+"""
+
+import atexit
+import calendar
+import json
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+try:
+    import fcntl
+except ImportError:      # Windows: rely on O_APPEND alone
+    fcntl = None
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+def log_field(value) -> str:
+    """A field value fit for one log line: CR, LF and other line breaks become spaces."""
+    return " ".join(str(value).splitlines())
+
+
+class EventLog:
+    """Line-oriented appender for one file, shared by all threads of a process."""
+
+    def __init__(self, path: str, fsync: str = None, fsync_interval: float = None):
+        # Read at construction so a .env loaded by the importing script applies
+        if fsync is None:
+            fsync = os.getenv("EVENT_LOG_FSYNC", "interval")
+        if fsync_interval is None:
+            fsync_interval = float(os.getenv("EVENT_LOG_FSYNC_INTERVAL", "1.0"))
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync policy must be one of {FSYNC_POLICIES}, not {fsync!r}")
+        self.path           = path
+        self.fsync          = fsync
+        self.fsync_interval = fsync_interval
+        self._fd            = None
+        self._cond          = threading.Condition()
+        self._pending       = []
+        self._queued        = 0        # sequence number of the last queued line
+        self._committed     = 0        # ... and of the last line written
+        self._writing       = False
+        self._failed        = None     # (first seq, last seq, error) of the last failed batch
+        self._last_sync     = time.monotonic()
+        self.commits        = 0
+        self.lines          = 0
+
+    def append(self, line: str):
+        """Append one line (newline added if missing); returns once it is written."""
+        if not line.endswith("\n"):
+            line += "\n"
+        with self._cond:
+            self._pending.append(line)
+            self._queued += 1
+            seq = self._queued
+            while self._committed < seq:
+                if self._writing:
+                    self._cond.wait()
+                    continue
+                batch, self._pending = self._pending, []
+                first, last = self._committed + 1, self._queued
+                self._writing = True
+                self._cond.release()
+                try:
+                    self._write(batch)
+                    error = None
+                except OSError as e:
+                    error = e
+                finally:
+                    self._cond.acquire()
+                    self._writing   = False
+                    self._committed = last
+                    if error is not None:
+                        self._failed = (first, last, error)
+                    self._cond.notify_all()
+            if self._failed and self._failed[0] <= seq <= self._failed[1]:
+                raise self._failed[2]
+
+    def _write(self, batch: list):
+        data = "".join(batch).encode("utf-8")
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if fcntl:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+            if self.fsync == "always" or (
+                    self.fsync == "interval" and time.monotonic() - self._last_sync >= self.fsync_interval):
+                os.fsync(self._fd)
+                self._last_sync = time.monotonic()
+        finally:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.commits += 1
+        self.lines   += len(batch)
+
+    def close(self):
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            if self._fd is not None:
+                if self.fsync != "never":
+                    os.fsync(self._fd)
+                os.close(self._fd)
+                self._fd = None
+
+    def stats(self) -> dict:
+        return {"path": self.path, "fsync": self.fsync, "lines": self.lines, "commits": self.commits}
+
+
+_logs      = {}
+_logs_lock = threading.Lock()
+
+
+def get_event_log(path: str) -> EventLog:
+    """Process-wide EventLog for `path` (one fd and one commit queue per file)."""
+    path = os.path.abspath(path)
+    with _logs_lock:
+        log = _logs.get(path)
+        if log is None:
+            log = _logs[path] = EventLog(path)
+        return log
+
+
+@atexit.register
+def _close_logs():
+    for log in list(_logs.values()):
+        try:
+            log.close()
+        except OSError:
+            pass
+
+
+# ─────────────────────────────────────────────
+#  Log index (byte offsets + secondary keys)
+# ─────────────────────────────────────────────
+
+LOG_LINE     = re.compile(r"^\[(?P<ts>[^\]]+)\] (?P<body>.*)$")
+LOG_OUTCOMES = ("other", "fine", "mild", "worsened", "appointment")   # filter values
+OPTION_OUTCOMES = {"1": 1, "2": 2, "3": 3}
+
+# Per line: byte offset, length, timestamp, patient key id, language key id, outcome
+INDEX_RECORD = struct.Struct("<QIdIIB")
+
+
+def parse_log_line(line: str):
+    """(timestamp, patient, language, outcome code) of one responses.txt line, or None.
+    Handles IVR lines with or without a Language field and APPOINTMENT lines.
+    """
+    m = LOG_LINE.match(line)
+    if not m:
+        return None
+    try:
+        ts = log_time(m.group("ts"))
+    except ValueError:
+        ts = 0.0
+    parts   = m.group("body").split(" | ")
+    fields  = dict(p.split(": ", 1) for p in parts if ": " in p)
+    outcome = 4 if parts[0] == "APPOINTMENT" else OPTION_OUTCOMES.get(fields.get("Option", "").strip(), 0)
+    language = fields.get("Language", fields.get("Lang", ""))
+    return ts, fields.get("Patient", "").strip(), language.strip(), outcome
+
+
+def log_time(value: str) -> float:
+    """'YYYY-MM-DD HH:MM:SS' wall-clock time as seconds, compared as-is (no timezone)."""
+    if len(value) != 19 or value[4] != "-" or value[10] != " ":
+        raise ValueError(f"bad log time {value!r}")
+    return float(calendar.timegm((int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                  int(value[11:13]), int(value[14:16]), int(value[17:19]))))
+
+
+def format_log_time(seconds: float) -> str:
+    """Inverse of log_time(): seconds back to 'YYYY-MM-DD HH:MM:SS'."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(seconds))
+
+
+def parse_log_time(value: str, end: bool = False) -> float:
+    """'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' filter bound (a bare date covers the whole day)."""
+    value = value.strip()
+    if len(value) == 10:
+        return log_time(value + (" 23:59:59" if end else " 00:00:00"))
+    return log_time(value)
+
+
+class LogIndex:
+    """Persistent, incrementally maintained index over a responses.txt-style log.
+    <log>.idx holds one fixed-width INDEX_RECORD per line and <log>.keys the
+    interned patient/language strings (one JSON string per line); both are
+    append-only, so catching up costs only the lines written since the last
+    query, whichever process wrote them. Posting lists per patient, language
+    and outcome are rebuilt in memory on first use, and queries read only
+    the matching lines from the log by offset, newest first.
+    """
+
+    def __init__(self, path: str):
+        self.path      = path
+        self.idx_path  = path + ".idx"
+        self.keys_path = path + ".keys"
+        self._lock     = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.offsets   = array("Q")
+        self.lengths   = array("I")
+        self.times     = array("d")
+        self.patients  = array("I")
+        self.languages = array("I")
+        self.outcomes  = array("B")
+        self.keys      = []
+        self.key_ids   = {}
+        self.postings  = {}       # ("patient"|"language"|"outcome", id) → array of record ids
+        self.in_order  = True     # timestamps non-decreasing → date range by bisect
+        self.indexed   = 0        # log bytes covered by the index
+        self._key_bytes = 0
+        self._idx_bytes = 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    # ── maintenance ──────────────────────────────────────────────
+    def refresh(self):
+        """Load index records other processes appended, then index new log lines."""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                self._reset()
+                return
+            fd = os.open(self.idx_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                if os.fstat(fd).st_size < self._idx_bytes:     # rebuilt by another process
+                    self._reset()
+                self._load_keys()
+                self._load_records(fd)
+                if self.indexed > size:          # log truncated or replaced
+                    os.ftruncate(fd, 0)
+                    open(self.keys_path, "w").close()
+                    self._reset()
+                if self.indexed < size:
+                    self._index_tail(fd, size)
+            finally:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _load_keys(self):
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._key_bytes)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for raw in data[:end].splitlines():
+            self._add_key(json.loads(raw))
+        self._key_bytes += end
+
+    def _load_records(self, fd):
+        size = os.fstat(fd).st_size
+        size -= (size - self._idx_bytes) % INDEX_RECORD.size      # ignore a torn record
+        if size <= self._idx_bytes:
+            return
+        os.lseek(fd, self._idx_bytes, os.SEEK_SET)
+        data = b""
+        while len(data) < size - self._idx_bytes:
+            chunk = os.read(fd, size - self._idx_bytes - len(data))
+            if not chunk:
+                break
+            data += chunk
+        for record in INDEX_RECORD.iter_unpack(data):
+            self._add_record(*record)
+        self._idx_bytes += len(data)
+
+    def _index_tail(self, fd, size):
+        with open(self.path, "rb") as log:
+            log.seek(self.indexed)
+            data = log.read(size - self.indexed)
+        records, new_keys, offset = [], [], self.indexed
+        pos = 0
+        while True:
+            end = data.find(b"\n", pos)          # "\n" only: a stray "\r" is not a line end
+            if end < 0:
+                break                            # half-written last line: next time
+            raw, pos = data[pos:end + 1], end + 1
+            parsed = parse_log_line(raw.decode("utf-8", "replace").rstrip("\r\n"))
+            if parsed:
+                ts, patient, language, outcome = parsed
+                ids = []
+                for key in (patient.lower(), language.lower()):
+                    if key not in self.key_ids:
+                        new_keys.append(key)
+                    ids.append(self._add_key(key))
+                record = (offset, len(raw), ts, ids[0], ids[1], outcome)
+                records.append(INDEX_RECORD.pack(*record))
+                self._add_record(*record)
+            offset += len(raw)
+        if new_keys:
+            with open(self.keys_path, "ab") as f:
+                blob = "".join(json.dumps(k) + "\n" for k in new_keys).encode("utf-8")
+                f.write(blob)
+            self._key_bytes += len(blob)
+        if records:
+            blob = b"".join(records)
+            os.lseek(fd, self._idx_bytes, os.SEEK_SET)
+            os.write(fd, blob)
+            self._idx_bytes += len(blob)
+        self.indexed = offset
+
+    def _add_key(self, key: str) -> int:
+        key_id = self.key_ids.get(key)
+        if key_id is None:
+            key_id = self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+        return key_id
+
+    def _add_record(self, offset, length, ts, patient, language, outcome):
+        rid = len(self.offsets)
+        if self.times and ts < self.times[-1]:
+            self.in_order = False
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.times.append(ts)
+        self.patients.append(patient)
+        self.languages.append(language)
+        self.outcomes.append(outcome)
+        for posting in (("patient", patient), ("language", language), ("outcome", outcome)):
+            self.postings.setdefault(posting, array("I")).append(rid)
+        self.indexed = offset + length
+
+    # ── queries ──────────────────────────────────────────────────
+    def query(self, patient=None, language=None, outcome=None, since=None, until=None,
+              before=None, limit=50):
+        """Newest-first matching lines. `before` is the cursor (record id, exclusive).
+        Returns (lines, next cursor or None).
+        """
+        self.refresh()
+        with self._lock:
+            candidates = []
+            for field, value in (("patient", patient), ("language", language)):
+                if value:
+                    key_id = self.key_ids.get(value.strip().lower())
+                    candidates.append(self.postings.get((field, key_id), array("I")))
+            if outcome:
+                candidates.append(self.postings.get(("outcome", LOG_OUTCOMES.index(outcome)), array("I")))
+
+            lo, hi = 0, len(self.offsets)
+            if before is not None:
+                hi = min(hi, before)
+            if self.in_order:
+                if since is not None:
+                    lo = bisect_left(self.times, since)
+                if until is not None:
+                    hi = min(hi, bisect_right(self.times, until))
+
+            # Walk the shortest posting list (or the record range) backwards
+            if candidates:
+                ids = min(candidates, key=len)
+                pos = bisect_left(ids, hi) - 1
+                stop = bisect_left(ids, lo)
+                walk = (ids[i] for i in range(pos, stop - 1, -1))
+            else:
+                walk = iter(range(hi - 1, lo - 1, -1))
+
+            patient_id  = self.key_ids.get(patient.strip().lower(), -1) if patient else None
+            language_id = self.key_ids.get(language.strip().lower(), -1) if language else None
+            outcome_id  = LOG_OUTCOMES.index(outcome) if outcome else None
+            matches = []
+            for rid in walk:
+                if patient_id is not None and self.patients[rid] != patient_id:
+                    continue
+                if language_id is not None and self.languages[rid] != language_id:
+                    continue
+                if outcome_id is not None and self.outcomes[rid] != outcome_id:
+                    continue
+                ts = self.times[rid]
+                if (since is not None and ts < since) or (until is not None and ts > until):
+                    continue
+                matches.append(rid)
+                if len(matches) > limit:
+                    break
+            spans = [(self.offsets[rid], self.lengths[rid]) for rid in matches[:limit]]
+
+        next_cursor = matches[limit - 1] if len(matches) > limit else None
+        lines = []
+        with open(self.path, "rb") as log:
+            for offset, length in spans:
+                log.seek(offset)
+                lines.append(log.read(length).decode("utf-8", "replace").strip())
+        return lines, next_cursor
+
+
+_indexes = {}
+
+
+def get_log_index(path: str) -> LogIndex:
+    """Process-wide LogIndex for `path`."""
+    path = os.path.abspath(path)
+    with _logs_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = LogIndex(path)
+        return index
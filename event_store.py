@@ -0,0 +1,236 @@
+"""
+MedFollow AI — SQLite event store for IVR outcomes and appointments
+The structured counterpart of responses.txt, shared by app.py and every
+offline_ivr.py process. The database runs in WAL mode so the web app can
+page through /log while IVR calls and bookings insert concurrently.
+Usage (one-shot import of an existing log):
+    python3 event_store.py import [responses.txt] [database]
+"""
+
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+from event_log import LOG_LINE
+
+BASE_DIR  = os.path.dirname(os.path.abspath(__file__))
+EVENTS_DB = os.getenv("EVENTS_DB", os.path.join(BASE_DIR, "medfollow.db"))
+
+# Where IVR outcomes and appointments are written and /log reads from:
+# "sqlite" (this store) or "text" (responses.txt via event_log)
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id           INTEGER PRIMARY KEY,
+    ts           TEXT    NOT NULL,                   -- 'YYYY-MM-DD HH:MM:SS', local time
+    kind         TEXT    NOT NULL CHECK (kind IN ('ivr', 'appointment')),
+    patient      TEXT    NOT NULL COLLATE NOCASE,
+    language     TEXT    COLLATE NOCASE,              -- NULL on pre-language IVR lines
+    outcome      TEXT    NOT NULL,                    -- one of event_log.LOG_OUTCOMES
+    option       TEXT,                                -- keypad input (IVR)
+    outcome_text TEXT,                                -- localized outcome (IVR)
+    doctor       TEXT,                                -- appointment fields
+    appt_date    TEXT,
+    appt_time    TEXT
+);
+CREATE INDEX IF NOT EXISTS events_patient  ON events (patient, id);
+CREATE INDEX IF NOT EXISTS events_language ON events (language, id);
+CREATE INDEX IF NOT EXISTS events_outcome  ON events (outcome, id);
+CREATE INDEX IF NOT EXISTS events_ts       ON events (ts);
+CREATE INDEX IF NOT EXISTS events_doctor   ON events (doctor, appt_date, appt_time) WHERE kind = 'appointment';
+
+CREATE TABLE IF NOT EXISTS imports (
+    path   TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL                           -- bytes of the log already imported
+);
+"""
+
+INSERT = ("INSERT INTO events (ts, kind, patient, language, outcome, option, outcome_text, "
+          "doctor, appt_date, appt_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+def now_ts() -> str:
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def option_outcome(option) -> str:
+    return {"1": "fine", "2": "mild", "3": "worsened"}.get(str(option).strip(), "other")
+
+
+def render_line(row) -> str:
+    """The responses.txt line for an events row (what /log has always shown)."""
+    if row["kind"] == "appointment":
+        return (f"[{row['ts']}] APPOINTMENT | Patient: {row['patient']} | Doctor: {row['doctor']} | "
+                f"Date: {row['appt_date']} | Time: {row['appt_time']} | Lang: {row['language']}")
+    language = f" | Language: {row['language']}" if row["language"] is not None else ""
+    return (f"[{row['ts']}] Patient: {row['patient']}{language} | "
+            f"Option: {row['option']} | Outcome: {row['outcome_text']}")
+
+
+class EventStore:
+    """Thread-safe access to the events database (one connection per thread)."""
+
+    def __init__(self, path: str = EVENTS_DB):
+        self.path   = path
+        self._local = threading.local()
+        self._ready = False
+        self._lock  = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._ready:
+                    conn.executescript(SCHEMA)
+                    self._ready = True
+            self._local.conn = conn
+        return conn
+
+    # ── writes ───────────────────────────────────────────────────
+    def record_ivr(self, patient: str, language: str, option, outcome_text: str, ts: str = None) -> int:
+        cur = self.connect().execute(INSERT, (ts or now_ts(), "ivr", patient, language,
+                                              option_outcome(option), str(option), outcome_text,
+                                              None, None, None))
+        return cur.lastrowid
+
+    def record_appointment(self, patient: str, doctor: str, date: str, time_val: str,
+                           language: str, ts: str = None) -> int:
+        cur = self.connect().execute(INSERT, (ts or now_ts(), "appointment", patient, language,
+                                              "appointment", None, None, doctor, date, time_val))
+        return cur.lastrowid
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE … COMMIT: one writer at a time across every process."""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # ── reads ────────────────────────────────────────────────────
+    def appointments_since(self, last_id: int):
+        """(id, doctor, appt_date, appt_time) of appointments recorded after `last_id`."""
+        return self.connect().execute(
+            "SELECT id, doctor, appt_date, appt_time FROM events "
+            "WHERE kind = 'appointment' AND id > ? ORDER BY id", (last_id,)).fetchall()
+
+    def query(self, patient=None, language=None, outcome=None, since=None, until=None,
+              before=None, limit=50):
+        """Newest-first events matching every given filter.
+        since/until are inclusive 'YYYY-MM-DD HH:MM:SS' bounds, as
+        format_log_time() writes them; `before` is the cursor (event id, exclusive).
+        Returns (rows, next cursor or None).
+        """
+        clauses, params = [], []
+        for column, value in (("patient", patient), ("language", language), ("outcome", outcome)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value.strip())
+        if since:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until:
+            clauses.append("ts <= ?")
+            params.append(until)
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.connect().execute(f"SELECT * FROM events {where} ORDER BY id DESC LIMIT ?",
+                                      params + [limit + 1]).fetchall()
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    # ── import ───────────────────────────────────────────────────
+    def import_log(self, log_path: str, batch: int = 5000) -> int:
+        """Stream a responses.txt into the store; re-running imports only new lines.
+        Both IVR formats (with and without Language) and APPOINTMENT lines are
+        understood; anything else is skipped. Each batch reads the saved offset,
+        inserts its rows and advances the offset in one BEGIN IMMEDIATE
+        transaction, so concurrent importers never insert a line twice.
+        """
+        conn     = self.connect()
+        key      = os.path.abspath(log_path)
+        imported = 0
+        with open(log_path, "rb") as f:
+            while True:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row    = conn.execute("SELECT offset FROM imports WHERE path = ?", (key,)).fetchone()
+                    offset = row["offset"] if row and row["offset"] <= os.fstat(f.fileno()).st_size else 0
+                    start, pending = offset, []
+                    f.seek(offset)
+                    for raw in f:
+                        if not raw.endswith(b"\n"):
+                            break                   # half-written last line
+                        offset += len(raw)
+                        event = import_row(raw.decode("utf-8", "replace").strip())
+                        if event:
+                            pending.append(event)
+                            if len(pending) >= batch:
+                                break
+                    if offset == start:
+                        conn.execute("ROLLBACK")
+                        return imported
+                    conn.executemany(INSERT, pending)
+                    conn.execute("INSERT INTO imports (path, offset) VALUES (?, ?) "
+                                 "ON CONFLICT (path) DO UPDATE SET offset = excluded.offset", (key, offset))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                imported += len(pending)
+
+
+def import_row(line: str):
+    """INSERT parameters for one responses.txt line, or None if it isn't an event."""
+    m = LOG_LINE.match(line)
+    if not m:
+        return None
+    parts  = m.group("body").split(" | ")
+    fields = dict(p.split(": ", 1) for p in parts if ": " in p)
+    if "Patient" not in fields:
+        return None
+    ts, patient = m.group("ts"), fields["Patient"].strip()
+    if parts[0] == "APPOINTMENT":
+        return (ts, "appointment", patient, fields.get("Lang"), "appointment", None, None,
+                fields.get("Doctor"), fields.get("Date"), fields.get("Time"))
+    option = fields.get("Option", "").strip()
+    return (ts, "ivr", patient, fields.get("Language"), option_outcome(option),
+            option, fields.get("Outcome"), None, None, None)
+
+
+_stores      = {}
+_stores_lock = threading.Lock()
+
+
+def get_event_store(path: str = EVENTS_DB) -> EventStore:
+    """Process-wide EventStore for `path`."""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = EventStore(path)
+        return store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "import":
+        print(__doc__)
+        sys.exit(1)
+    log_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(BASE_DIR, "responses.txt")
+    db_path  = sys.argv[3] if len(sys.argv) > 3 else EVENTS_DB
+    count    = EventStore(db_path).import_log(log_path)
+    print(f"Imported {count} event(s) from {log_path} into {db_path}")
@@ -0,0 +1,197 @@
+"""
+MedFollow AI — in-process IVR call sessions
+The run_ivr() flow of offline_ivr.py as a state machine the web app drives:
+starting a call returns the opening prompts, the keypad digit arrives via
+the API, and the outcome is logged exactly as offline_ivr.log_response()
+logs it. A call is a few hundred bytes of state, so one process holds
+hundreds of them without a terminal or interpreter per call.
+
+    awaiting_input ──keypad──▶ completed
+          │ ├────────hangup──▶ hung_up
+          │ └───────timeout──▶ expired      (nothing logged, like a closed terminal)
+
+Finished calls stay readable for IVR_SESSION_RETAIN seconds (less when new
+calls need the room), then are dropped.
+"""
+
+import heapq
+import os
+import threading
+import time
+import uuid
+
+import offline_ivr
+
+IVR_MAX_SESSIONS   = int(os.getenv("IVR_MAX_SESSIONS", "1000"))
+IVR_INPUT_TIMEOUT  = float(os.getenv("IVR_INPUT_TIMEOUT", "180"))    # seconds to wait for a keypress
+IVR_SESSION_RETAIN = float(os.getenv("IVR_SESSION_RETAIN", "300"))   # keep finished calls this long
+
+AWAITING_INPUT = "awaiting_input"
+COMPLETED      = "completed"
+HUNG_UP        = "hung_up"
+EXPIRED        = "expired"
+
+# state -> event -> next state
+TRANSITIONS = {
+    AWAITING_INPUT: {"keypad": COMPLETED, "hangup": HUNG_UP, "timeout": EXPIRED},
+}
+
+OPENING_PROMPTS = ("greeting", "listen", "opt1", "opt2", "opt3")
+
+
+class CallStateError(Exception):
+    """An event that the call's current state does not accept."""
+
+
+def prompt(p, phrase_id: str, text: str, language: str) -> dict:
+    """A prompt for the client: its text plus the key of prerendered audio, if any."""
+    cfg  = offline_ivr.EDGE_VOICES.get(language, offline_ivr.EDGE_VOICES["English"])
+    key  = offline_ivr.tts_cache_key(text, cfg["voice"], cfg["rate"], cfg["pitch"])
+    path = offline_ivr.bundle_get(key) or offline_ivr.tts_cache_get(key)
+    return {"id": phrase_id, "text": text, "audio_key": key if path else None}
+
+
+class CallSession:
+    __slots__ = ("call_id", "patient", "language", "state", "choice", "outcome", "alert",
+                 "started", "deadline", "prompts", "recording")
+
+    def __init__(self, patient: str, language: str, now: float):
+        p = offline_ivr.PHRASES.get(language, offline_ivr.PHRASES["English"])
+        self.call_id  = uuid.uuid4().hex
+        self.patient  = patient
+        self.language = language
+        self.state    = AWAITING_INPUT
+        self.choice   = None
+        self.outcome  = None
+        self.alert    = False
+        self.started  = now
+        self.deadline = now + IVR_INPUT_TIMEOUT
+        self.recording = False          # a keypad outcome is being written
+        self.prompts  = [prompt(p, pid, p[pid].format(name=patient), language) for pid in OPENING_PROMPTS]
+
+    def menu(self):
+        p = offline_ivr.PHRASES.get(self.language, offline_ivr.PHRASES["English"])
+        return {"prompt": p["choice_prompt"], "choices": [p["choice_1"], p["choice_2"], p["choice_3"]]}
+
+    def to_dict(self) -> dict:
+        data = {"call_id": self.call_id, "patient": self.patient, "language": self.language,
+                "state": self.state, "prompts": self.prompts}
+        if self.state == AWAITING_INPUT:
+            data["menu"]       = self.menu()
+            data["expires_in"] = max(0, round(self.deadline - time.monotonic()))
+        if self.state == COMPLETED:
+            data.update(choice=self.choice, outcome=self.outcome, alert=self.alert)
+        return data
+
+
+class CallSessionManager:
+    """Every live call of this process; one lock, timeouts swept from a deadline heap."""
+
+    def __init__(self, max_sessions: int = IVR_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.sessions     = {}
+        self.deadlines    = []          # (deadline, call_id), lazily invalidated
+        self.lock         = threading.Lock()
+        self.counts       = {COMPLETED: 0, HUNG_UP: 0, EXPIRED: 0, "rejected": 0}
+
+    def _transition(self, session: CallSession, event: str, now: float):
+        state = TRANSITIONS.get(session.state, {}).get(event)
+        if state is None:
+            raise CallStateError(f"call is {session.state}")
+        session.state    = state
+        session.deadline = now + IVR_SESSION_RETAIN
+        heapq.heappush(self.deadlines, (session.deadline, session.call_id))
+        self.counts[state] += 1
+
+    def _sweep(self, now: float):
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, call_id = heapq.heappop(self.deadlines)
+            session = self.sessions.get(call_id)
+            if session is None or session.deadline != deadline:
+                continue                            # superseded by a later deadline
+            if session.recording:
+                continue                            # press() settles it either way
+            if session.state == AWAITING_INPUT:
+                self._transition(session, "timeout", now)
+            else:
+                del self.sessions[call_id]
+
+    def start(self, patient: str, language: str):
+        """A new call awaiting input, or None if IVR_MAX_SESSIONS calls are awaiting
+        input already. Finished calls kept for IVR_SESSION_RETAIN don't count; the
+        oldest of them are dropped early when the table is full.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self._sweep(now)
+            if len(self.sessions) >= self.max_sessions:
+                active = sum(1 for s in self.sessions.values() if s.state == AWAITING_INPUT)
+                if active >= self.max_sessions:
+                    self.counts["rejected"] += 1
+                    return None
+                finished = sorted((s.deadline, s.call_id) for s in self.sessions.values()
+                                  if s.state != AWAITING_INPUT)
+                for _, call_id in finished[:len(self.sessions) - self.max_sessions + 1]:
+                    del self.sessions[call_id]
+            session = CallSession(patient, language, now)
+            self.sessions[session.call_id] = session
+            heapq.heappush(self.deadlines, (session.deadline, session.call_id))
+            return session
+
+    def get(self, call_id: str):
+        with self.lock:
+            self._sweep(time.monotonic())
+            return self.sessions.get(call_id)
+
+    def press(self, call_id: str, digits: str) -> CallSession:
+        """Apply the caller's keypad entry, log the outcome and queue the closing prompts.
+        The call completes only once the outcome is stored; if the write fails
+        the call is still awaiting input and the press can be retried.
+        Raises KeyError for an unknown call and CallStateError if it isn't awaiting input.
+        """
+        choice = str(digits).strip()
+        with self.lock:
+            self._sweep(time.monotonic())
+            session = self.sessions[call_id]
+            if session.state != AWAITING_INPUT or session.recording:
+                raise CallStateError("call is " + ("recording a choice" if session.recording else session.state))
+            session.recording = True
+        p = offline_ivr.PHRASES.get(session.language, offline_ivr.PHRASES["English"])
+        outcome, response, alert = offline_ivr.call_response(p, choice, session.patient)
+        try:
+            offline_ivr.record_response(session.patient, session.language, choice, outcome)
+        except BaseException:
+            with self.lock:
+                session.recording = False
+                heapq.heappush(self.deadlines, (session.deadline, session.call_id))
+            raise
+        with self.lock:
+            session.recording = False
+            self._transition(session, "keypad", time.monotonic())
+            session.choice, session.outcome, session.alert = choice, outcome, alert
+            session.prompts = [prompt(p, "response", response, session.language),
+                               prompt(p, "closing", p["closing"], session.language)]
+        return session
+
+    def hangup(self, call_id: str) -> CallSession:
+        """End a call awaiting input. Raises KeyError for an unknown call and
+        CallStateError if it isn't awaiting input or a keypad choice is being stored.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self._sweep(now)
+            session = self.sessions[call_id]
+            if session.recording:
+                raise CallStateError("call is recording a choice")
+            self._transition(session, "hangup", now)
+            return session
+
+    def stats(self) -> dict:
+        with self.lock:
+            self._sweep(time.monotonic())
+            active = sum(1 for s in self.sessions.values() if s.state == AWAITING_INPUT)
+            return {"active": active, "retained": len(self.sessions) - active,
+                    "max_sessions": self.max_sessions, **self.counts}
+
+
+call_sessions = CallSessionManager()
@@ -4,6 +4,7 @@ MedFollow AI — Offline IVR System
 Uses edge-tts (Microsoft Neural TTS) for high-quality voices.
 Falls back to pyttsx3 if edge-tts or internet is unavailable.
 Usage: python3 offline_ivr.py "Patient Name" "Language"
+       python3 offline_ivr.py --prebuild [--force]   (render the static phrase bundle)
 """
 
 import os
@@ -12,13 +13,34 @@ import subprocess
 import datetime
 import asyncio
 import tempfile
+import hashlib
+import json
+import atexit
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:      # Windows: bundle builds are not serialized
+    fcntl = None
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()      # same .env as app.py, so EVENTS_BACKEND / EVENTS_DB agree
+except ImportError:
+    pass
+
+from event_log import get_event_log, log_field  # noqa: E402
+from event_store import EVENTS_BACKEND, get_event_store  # noqa: E402
 
 BASE_DIR       = os.path.dirname(os.path.abspath(__file__))
 RESPONSES_FILE = os.path.join(BASE_DIR, "responses.txt")
 RINGTONE_FILE  = os.path.join(BASE_DIR, "iphone_14.mp3")
 
-PATIENT_NAME = sys.argv[1] if len(sys.argv) > 1 else "Patient"
-LANGUAGE     = sys.argv[2] if len(sys.argv) > 2 else "English"
+# The call's patient and language; set from the command line in __main__
+PATIENT_NAME = "Patient"
+LANGUAGE     = "English"
 
 # ─────────────────────────────────────────────
 #  Neural Voice Map  (edge-tts voice names)
@@ -137,21 +159,153 @@ def get_p():
 #  Audio Playback Helper
 # ─────────────────────────────────────────────
 
+# Everything is decoded to raw mono 16-bit PCM at AUDIO_RATE (edge-tts' native
+# rate) and streamed into one long-lived output, so a phrase costs a pipe
+# write instead of a player process. AUDIO_SINK picks the output:
+# "auto", "sounddevice" (in-process), "aplay", "pacat", or "player" (the old
+# per-file players, used automatically when no decoder/sink is installed).
+AUDIO_RATE = int(os.getenv("AUDIO_RATE", "24000"))
+AUDIO_SINK = os.getenv("AUDIO_SINK", "auto")
+
+AUDIO_DECODERS = {
+    "ffmpeg": ["ffmpeg", "-v", "quiet", "-i", "{path}", "-f", "s16le", "-ac", "1", "-ar", str(AUDIO_RATE), "-"],
+    "mpg123": ["mpg123", "-q", "-s", "-m", "-e", "s16", "-r", str(AUDIO_RATE), "{path}"],
+}
+AUDIO_SINKS = {
+    "aplay": ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-c", "1", "-r", str(AUDIO_RATE)],
+    "pacat": ["pacat", "--raw", "--format=s16le", "--channels=1", f"--rate={AUDIO_RATE}"],
+}
+AUDIO_PLAYERS = {
+    "mpg123": ["mpg123", "-q", "{path}"],
+    "ffplay": ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "{path}"],
+    "cvlc":   ["cvlc", "--play-and-exit", "--quiet", "{path}"],
+    "aplay":  ["aplay", "{path}"],
+}
+
+
+def _command(template, path):
+    return [path if arg == "{path}" else arg for arg in template]
+
+
+class AudioOutput:
+    """Process-wide audio output: tools are discovered once, clips decoded once."""
+
+    def __init__(self, sink: str = AUDIO_SINK):
+        self.lock     = threading.Lock()
+        self.decoder  = next((t for name, t in AUDIO_DECODERS.items() if shutil.which(name)), None)
+        self.player   = next((t for name, t in AUDIO_PLAYERS.items() if shutil.which(name)), None)
+        self.sink_cmd = None
+        self.sink     = None
+        self.device   = None
+        self.pcm      = {}              # path -> decoded PCM, for clips replayed in this process
+        if self.decoder is None or sink == "player":
+            return
+        if sink in ("auto", "sounddevice"):
+            try:
+                import numpy
+                import sounddevice
+                self.device = (sounddevice, numpy)
+                return
+            except Exception:       # not installed, or no PortAudio device
+                pass
+        for name, template in AUDIO_SINKS.items():
+            if sink in ("auto", name) and shutil.which(name):
+                self.sink_cmd = template
+                break
+
+    @property
+    def mode(self) -> str:
+        if self.device:
+            return "sounddevice"
+        if self.sink_cmd:
+            return self.sink_cmd[0]
+        return self.player[0] if self.player else "none"
+
+    def decode(self, path: str):
+        """Raw PCM for an audio file, decoded at most once per file version.
+        The PCM is kept in the TTS cache keyed by the file's content, so
+        later calls — other processes included — skip the decoder too.
+        """
+        pcm = self.pcm.get(path)
+        if pcm is not None:
+            return pcm
+        with open(path, "rb") as f:
+            key = hashlib.sha256(f.read() + f"\0pcm\0{AUDIO_RATE}".encode()).hexdigest()
+        pcm_path = tts_cache_get(key, ".pcm")
+        if pcm_path is None:
+            def run_decoder(out):
+                with open(out, "wb") as f:
+                    subprocess.run(_command(self.decoder, path), check=True, stdout=f, stderr=subprocess.DEVNULL)
+            pcm_path = tts_cache_put(key, run_decoder, ".pcm")
+        with open(pcm_path, "rb") as f:
+            pcm = f.read()
+        if len(self.pcm) >= 32:
+            self.pcm.pop(next(iter(self.pcm)))
+        self.pcm[path] = pcm
+        return pcm
+
+    def _write_sink(self, pcm: bytes):
+        for attempt in range(2):
+            if self.sink is None or self.sink.poll() is not None:
+                self.sink = subprocess.Popen(self.sink_cmd, stdin=subprocess.PIPE,
+                                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                self.sink.stdin.write(pcm)
+                self.sink.stdin.flush()
+                return
+            except (BrokenPipeError, OSError):
+                self.sink = None
+                if attempt:
+                    raise
+
+    def play(self, path: str) -> bool:
+        """Play an audio file to the end; False if there is no way to play it."""
+        with self.lock:
+            if self.device or self.sink_cmd:
+                try:
+                    pcm = self.decode(path)
+                    if self.device:
+                        sounddevice, numpy = self.device
+                        sounddevice.play(numpy.frombuffer(pcm, dtype=numpy.int16), AUDIO_RATE, blocking=True)
+                    else:
+                        # The pipe returns once the sink has buffered the clip;
+                        # wait out the rest so callers still block until it's heard.
+                        started = time.monotonic()
+                        self._write_sink(pcm)
+                        time.sleep(max(0.0, len(pcm) / (2 * AUDIO_RATE) - (time.monotonic() - started)))
+                    return True
+                except (OSError, subprocess.CalledProcessError, RuntimeError):
+                    pass                # undecodable clip or dead sink: try the plain player
+            if self.player is None:
+                return False
+            try:
+                subprocess.run(_command(self.player, path), check=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                return True
+            except (FileNotFoundError, subprocess.CalledProcessError):
+                return False
+
+    def close(self):
+        with self.lock:
+            if self.sink is not None and self.sink.poll() is None:
+                self.sink.stdin.close()
+                self.sink.wait()
+            self.sink = None
+
+
+_audio_output = None
+
+def get_audio_output() -> AudioOutput:
+    global _audio_output
+    if _audio_output is None:
+        _audio_output = AudioOutput()
+        atexit.register(_audio_output.close)
+    return _audio_output
+
+
 def play_file(filepath):
     """Play an audio file (mp3 or wav) using available system player."""
-    players = [
-        ["mpg123", "-q", filepath],
-        ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", filepath],
-        ["cvlc", "--play-and-exit", "--quiet", filepath],
-        ["aplay", filepath],
-    ]
-    for cmd in players:
-        try:
-            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            return True
-        except (FileNotFoundError, subprocess.CalledProcessError):
-            continue
-    return False
+    return get_audio_output().play(filepath)
 
 
 def play_ringtone():
@@ -162,6 +316,266 @@ def play_ringtone():
         print("[INFO] No audio player found. Skipping ringtone.")
 
 
+# ─────────────────────────────────────────────
+#  TTS audio cache  (content-addressed, shared by all IVR processes)
+# ─────────────────────────────────────────────
+
+TTS_CACHE_DIR       = os.getenv("TTS_CACHE_DIR", os.path.join(BASE_DIR, "tts_cache"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+TTS_CACHE_VERSION   = "1"    # bump to invalidate every entry (e.g. new audio format)
+
+
+def tts_cache_key(text: str, voice: str, rate: str, pitch: str) -> str:
+    payload = json.dumps([TTS_CACHE_VERSION, text, voice, rate, pitch], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def tts_cache_path(key: str, ext: str = ".mp3") -> str:
+    return os.path.join(TTS_CACHE_DIR, key[:2], key + ext)
+
+
+def tts_cache_get(key: str, ext: str = ".mp3"):
+    """Path of the cached audio for `key`, or None. A hit refreshes its LRU stamp."""
+    path = tts_cache_path(key, ext)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def tts_cache_put(key: str, synthesize, ext: str = ".mp3") -> str:
+    """Run synthesize(tmp_path) and publish the result under `key`.
+    The audio is written to a temp file beside its final name and moved in
+    with os.replace(), so other processes see either nothing or the whole
+    file — two callers racing on one phrase just publish identical audio.
+    """
+    path = tts_cache_path(key, ext)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        synthesize(tmp_path)
+        if os.path.getsize(tmp_path) == 0:
+            raise RuntimeError("synthesis produced no audio")
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _tts_cache_grew(os.path.getsize(path))
+    return path
+
+
+_tts_cache_bytes = None             # this process's running estimate of the cache size
+_tts_cache_lock  = threading.Lock()
+
+def _tts_cache_grew(added: int):
+    """Count a new entry; walk the cache (and evict) only when the estimate
+    crosses TTS_CACHE_MAX_BYTES, or the first time this process writes.
+    Entries written by other processes are picked up by that walk.
+    """
+    global _tts_cache_bytes
+    with _tts_cache_lock:
+        if _tts_cache_bytes is not None:
+            _tts_cache_bytes += added
+            if _tts_cache_bytes <= TTS_CACHE_MAX_BYTES:
+                return
+    total = tts_cache_evict()
+    with _tts_cache_lock:
+        _tts_cache_bytes = total
+
+
+def tts_cache_evict(max_bytes: int = None) -> int:
+    """Delete least-recently-used entries until the cache fits in max_bytes.
+    Returns the size of what is left.
+    """
+    max_bytes = TTS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries, total = [], 0
+    for root, _, files in os.walk(TTS_CACHE_DIR):
+        for name in files:
+            if not name.endswith((".mp3", ".pcm")):
+                continue
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue            # evicted by another process meanwhile
+            entries.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+            total += st.st_size
+    if total <= max_bytes:
+        return total
+    for _, size, path in sorted(entries):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        total -= size
+        if total <= max_bytes * 0.9:      # leave headroom so we don't evict on every put
+            break
+    return total
+
+
+# ─────────────────────────────────────────────
+#  Prebuilt phrase bundle  (python3 offline_ivr.py --prebuild)
+# ─────────────────────────────────────────────
+# Every spoken phrase without a {name} placeholder is rendered ahead of time
+# for every language/voice into TTS_BUNDLE_DIR/<version>/, described by a
+# manifest.json; TTS_BUNDLE_DIR/CURRENT names the live bundle. Entries are
+# keyed exactly like the TTS cache, so editing a phrase or a voice setting
+# simply makes its old entry unreachable until the next prebuild.
+
+TTS_BUNDLE_DIR  = os.getenv("TTS_BUNDLE_DIR", os.path.join(BASE_DIR, "tts_bundle"))
+BUNDLE_FAILED_FILE = os.path.join(TTS_BUNDLE_DIR, "FAILED")    # version whose rebuild failed
+SPOKEN_PHRASES  = ("greeting", "listen", "opt1", "opt2", "opt3",
+                   "resp_1", "resp_2", "resp_3", "resp_invalid", "closing")
+
+
+def static_phrases():
+    """(language, phrase id, text, voice config) for every non-personalized spoken phrase."""
+    for language, phrases in PHRASES.items():
+        voice_cfg = EDGE_VOICES.get(language, EDGE_VOICES["English"])
+        for phrase_id in SPOKEN_PHRASES:
+            text = phrases[phrase_id]
+            if "{name}" not in text:
+                yield language, phrase_id, text, voice_cfg
+
+
+def bundle_version() -> str:
+    """Fingerprint of every static phrase's text and voice settings."""
+    keys = [tts_cache_key(text, cfg["voice"], cfg["rate"], cfg["pitch"])
+            for _, _, text, cfg in static_phrases()]
+    return hashlib.sha256("\n".join(keys).encode()).hexdigest()[:16]
+
+
+def read_bundle_manifest():
+    """Manifest of the live bundle, or None if none has been built."""
+    try:
+        with open(os.path.join(TTS_BUNDLE_DIR, "CURRENT"), encoding="utf-8") as f:
+            version = f.read().strip()
+        with open(os.path.join(TTS_BUNDLE_DIR, version, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+_bundle_files = None
+
+def bundle_get(key: str):
+    """Path of the prebuilt audio for cache key `key`, or None."""
+    global _bundle_files
+    if _bundle_files is None:
+        manifest = read_bundle_manifest() or {"version": "", "phrases": {}}
+        folder   = os.path.join(TTS_BUNDLE_DIR, manifest["version"])
+        _bundle_files = {entry["key"]: os.path.join(folder, entry["file"])
+                         for entries in manifest["phrases"].values() for entry in entries.values()}
+    path = _bundle_files.get(key)
+    return path if path and os.path.exists(path) else None
+
+
+def bundle_stale() -> bool:
+    manifest = read_bundle_manifest()
+    return manifest is None or manifest["version"] != bundle_version()
+
+
+def prebuild_bundle(force: bool = False) -> str:
+    """Render every static phrase into a new bundle and make it the live one.
+    Audio already in the previous bundle or the TTS cache is reused, so a
+    rebuild after editing one phrase synthesizes just that phrase.
+    Returns the bundle version.
+    """
+    version = bundle_version()
+    if not force and not bundle_stale():
+        print(f"Bundle {version} is up to date.")
+        return version
+
+    os.makedirs(TTS_BUNDLE_DIR, exist_ok=True)
+    with open(os.path.join(TTS_BUNDLE_DIR, ".lock"), "w") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)        # one builder at a time
+        if not force and not bundle_stale():
+            return version                          # another process just built it
+
+        previous = read_bundle_manifest()
+        old_files = {}
+        if previous:
+            old_dir   = os.path.join(TTS_BUNDLE_DIR, previous["version"])
+            old_files = {entry["key"]: os.path.join(old_dir, entry["file"])
+                         for entries in previous["phrases"].values() for entry in entries.values()}
+
+        folder = os.path.join(TTS_BUNDLE_DIR, version)
+        os.makedirs(folder, exist_ok=True)
+        manifest = {"version": version, "cache_version": TTS_CACHE_VERSION,
+                    "built": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "phrases": {}}
+        synthesized = 0
+        for language, phrase_id, text, cfg in static_phrases():
+            key  = tts_cache_key(text, cfg["voice"], cfg["rate"], cfg["pitch"])
+            name = f"{language}-{phrase_id}.mp3"
+            dest = os.path.join(folder, name)
+            source = None
+            if not force:
+                source = old_files.get(key)
+                if source is None or not os.path.exists(source):
+                    source = tts_cache_get(key)
+            if source is None:
+                print(f"  synthesizing [{language}] {phrase_id}")
+                source = tts_cache_put(key, lambda out, text=text, cfg=cfg: asyncio.run(
+                    _edge_speak_async(text, cfg["voice"], cfg["rate"], cfg["pitch"], out)))
+                synthesized += 1
+            if os.path.abspath(source) != os.path.abspath(dest):
+                tmp_path = dest + ".part"
+                try:
+                    os.link(source, tmp_path)       # survives cache eviction, costs no space
+                except OSError:
+                    shutil.copyfile(source, tmp_path)
+                os.replace(tmp_path, dest)
+            manifest["phrases"].setdefault(language, {})[phrase_id] = {
+                "file": name, "key": key, "text": text,
+                "voice": cfg["voice"], "rate": cfg["rate"], "pitch": cfg["pitch"]}
+
+        with open(os.path.join(folder, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(TTS_BUNDLE_DIR, "CURRENT.part"), "w") as f:
+            f.write(version + "\n")
+        os.replace(os.path.join(TTS_BUNDLE_DIR, "CURRENT.part"), os.path.join(TTS_BUNDLE_DIR, "CURRENT"))
+
+        for entry in os.listdir(TTS_BUNDLE_DIR):   # drop superseded bundles
+            path = os.path.join(TTS_BUNDLE_DIR, entry)
+            if entry != version and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    try:
+        os.remove(BUNDLE_FAILED_FILE)
+    except OSError:
+        pass
+    count = sum(len(entries) for entries in manifest["phrases"].values())
+    print(f"Bundle {version}: {count} phrase(s), {synthesized} synthesized.")
+    return version
+
+
+def refresh_bundle_in_background():
+    """Start a detached --prebuild when phrase text or voices changed since the last build.
+    Skipped without edge-tts, and for a version whose rebuild already failed
+    (run --prebuild by hand to retry).
+    """
+    if not bundle_stale():
+        return
+    try:
+        import edge_tts  # noqa: F401
+    except ImportError:
+        return
+    try:
+        with open(BUNDLE_FAILED_FILE, encoding="utf-8") as f:
+            if f.read().strip() == bundle_version():
+                return
+    except OSError:
+        pass
+    print("[INFO] Phrase bundle is out of date; rebuilding in the background.")
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "--prebuild"],
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+
 # ─────────────────────────────────────────────
 #  edge-tts  (primary — neural, natural voice)
 # ─────────────────────────────────────────────
@@ -172,38 +586,43 @@ async def _edge_speak_async(text: str, voice: str, rate: str, pitch: str, out_pa
     await communicate.save(out_path)
 
 
-def speak_edge(text: str) -> bool:
+def edge_audio(text: str):
     """
-    Speak using edge-tts neural voice with natural rate and pitch.
-    Returns True on success, False if edge-tts unavailable or no internet.
+    Path of the edge-tts rendering of `text` in the call's voice, or None if
+    edge-tts is unavailable or synthesis failed. Phrases in the prebuilt
+    bundle or the TTS cache come straight from disk (no network, no
+    synthesis); anything else is synthesized once and cached.
     """
-    try:
-        import edge_tts  # noqa: F401
-    except ImportError:
-        return False
-
     voice_cfg = EDGE_VOICES.get(LANGUAGE, EDGE_VOICES["English"])
     voice = voice_cfg["voice"]
     rate  = voice_cfg["rate"]
     pitch = voice_cfg["pitch"]
-    print(f"\n\U0001f50a [{LANGUAGE}] {text}")
-
-    tmp = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
-    tmp.close()
-    tmp_path = tmp.name
+    key   = tts_cache_key(text, voice, rate, pitch)
 
+    path = bundle_get(key) or tts_cache_get(key)
+    if path is not None:
+        return path
     try:
-        asyncio.run(_edge_speak_async(text, voice, rate, pitch, tmp_path))
-        success = play_file(tmp_path)
-        return success
+        import edge_tts  # noqa: F401
+    except ImportError:
+        return None
+    try:
+        return tts_cache_put(key, lambda out: asyncio.run(_edge_speak_async(text, voice, rate, pitch, out)))
     except Exception as e:
         print(f"[WARN] edge-tts failed: {e}")
+        return None
+
+
+def speak_edge(text: str) -> bool:
+    """
+    Speak using edge-tts neural voice with natural rate and pitch.
+    Returns True on success, False if edge-tts unavailable or no internet.
+    """
+    path = edge_audio(text)
+    if path is None:
         return False
-    finally:
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
+    print(f"\n\U0001f50a [{LANGUAGE}] {text}")
+    return play_file(path)
 
 
 # ─────────────────────────────────────────────
@@ -252,16 +671,64 @@ def speak(text: str):
         speak_pyttsx3(text)
 
 
+# How many phrases may be synthesized ahead of the one playing
+TTS_PIPELINE_DEPTH = int(os.getenv("TTS_PIPELINE_DEPTH", "2"))
+
+
+async def _speak_pipeline(texts):
+    queue = asyncio.Queue(maxsize=TTS_PIPELINE_DEPTH)
+
+    async def produce():
+        for text in texts:
+            await queue.put((text, await asyncio.to_thread(edge_audio, text)))
+        await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (item := await queue.get()) is not None:
+            text, path = item
+            if path is not None:
+                print(f"\n\U0001f50a [{LANGUAGE}] {text}")
+                if await asyncio.to_thread(play_file, path):
+                    continue
+            speak_pyttsx3(text)
+    finally:
+        producer.cancel()
+
+
+def speak_sequence(texts):
+    """
+    Speak several phrases back to back. Synthesis of phrase N+1 runs while
+    phrase N is playing, so only the first phrase's synthesis is dead air.
+    """
+    asyncio.run(_speak_pipeline(list(texts)))
+
+
 # ─────────────────────────────────────────────
 #  Logging
 # ─────────────────────────────────────────────
 
-def log_response(patient_name, language, option, outcome):
+def record_response(patient_name, language, option, outcome) -> str:
+    """Store one call outcome; returns where it went, for the console message."""
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    line = f"[{timestamp}] Patient: {patient_name} | Language: {language} | Option: {option} | Outcome: {outcome}\n"
-    with open(RESPONSES_FILE, "a") as f:
-        f.write(line)
-    print(f"\n📝 Logged to responses.txt")
+    if EVENTS_BACKEND == "sqlite":
+        get_event_store().record_ivr(patient_name, language, option, outcome, timestamp)
+        return "the event store"
+    line = (f"[{timestamp}] Patient: {log_field(patient_name)} | Language: {log_field(language)} | "
+            f"Option: {log_field(option)} | Outcome: {log_field(outcome)}\n")
+    get_event_log(RESPONSES_FILE).append(line)
+    return "responses.txt"
+
+
+def log_response(patient_name, language, option, outcome):
+    print(f"\n📝 Logged to {record_response(patient_name, language, option, outcome)}")
+
+
+def call_response(p, choice: str, name: str):
+    """(outcome, spoken response, doctor alert?) for a keypad choice."""
+    if choice in ("1", "2", "3"):
+        return p[f"outcome_{choice}"], p[f"resp_{choice}"].format(name=name), choice == "3"
+    return f"{p['outcome_inv']}: '{choice}'", p["resp_invalid"], False
 
 
 # ─────────────────────────────────────────────
@@ -283,11 +750,7 @@ def run_ivr():
     play_ringtone()
 
     # Greeting
-    speak(p["greeting"].format(name=PATIENT_NAME))
-    speak(p["listen"])
-    speak(p["opt1"])
-    speak(p["opt2"])
-    speak(p["opt3"])
+    speak_sequence([p["greeting"].format(name=PATIENT_NAME), p["listen"], p["opt1"], p["opt2"], p["opt3"]])
 
     # Input menu
     print("\n" + "-" * 45)
@@ -299,28 +762,38 @@ def run_ivr():
     choice = input("  > ").strip()
 
     # Response
-    if choice == "1":
-        outcome = p["outcome_1"]
-        speak(p["resp_1"].format(name=PATIENT_NAME))
-    elif choice == "2":
-        outcome = p["outcome_2"]
-        speak(p["resp_2"].format(name=PATIENT_NAME))
-    elif choice == "3":
-        outcome = p["outcome_3"]
-        speak(p["resp_3"].format(name=PATIENT_NAME))
+    outcome, response, alert = call_response(p, choice, PATIENT_NAME)
+    if alert:
         print("\n" + "!" * 55)
         print(f"  🚨  {p['alert']}  🚨")
         print(f"  Patient : {PATIENT_NAME}")
         print(f"  Language: {LANGUAGE}")
         print("!" * 55)
-    else:
-        outcome = f"{p['outcome_inv']}: '{choice}'"
-        speak(p["resp_invalid"])
 
-    speak(p["closing"])
+    speak_sequence([response, p["closing"]])
     log_response(PATIENT_NAME, LANGUAGE, choice, outcome)
     print("\n✅ Call completed.\n")
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--prebuild":
+        try:
+            import edge_tts  # noqa: F401
+        except ImportError:
+            print("[ERROR] --prebuild needs edge-tts (pip install edge-tts).")
+            sys.exit(1)
+        try:
+            prebuild_bundle(force="--force" in sys.argv[2:])
+        except Exception as e:
+            print(f"[ERROR] Bundle build failed: {e}")
+            os.makedirs(TTS_BUNDLE_DIR, exist_ok=True)
+            with open(BUNDLE_FAILED_FILE, "w", encoding="utf-8") as f:
+                f.write(bundle_version() + "\n")      # no background retries for this version
+            sys.exit(1)
+        sys.exit(0)
+    if len(sys.argv) > 1:
+        PATIENT_NAME = sys.argv[1]
+    if len(sys.argv) > 2:
+        LANGUAGE = sys.argv[2]
+    refresh_bundle_in_background()
     run_ivr()
@@ -398,6 +398,17 @@ async function bookAppointment() {
         });
         const data = await res.json();
 
+        if (res.status === 409) {
+            // Slot taken: suggest the nearest free ones and pre-fill the first
+            const alts = (data.alternatives || []).map(a => `${a.date} ${a.time}`).join(', ');
+            showFloatingAlert(alts ? `${data.error} → ${alts}` : data.error);
+            if (data.alternatives && data.alternatives.length) {
+                document.getElementById('aptDate').value = data.alternatives[0].date;
+                document.getElementById('aptTime').value = data.alternatives[0].time;
+            }
+            return;
+        }
+
         // Already returning to dashboard after waiting for floating alert
         const successMsg = t('alert_apt_success') || "Appointment booked successfully.";
         showFloatingAlert(successMsg);
@@ -444,21 +455,36 @@ async function sendMessage() {
     const typingId = appendTypingIndicator();
 
     try {
-        const res = await fetch(`${API_URL}/postop-chat`, {
+        const res = await fetch(`${API_URL}/postop-chat/stream`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(req)
         });
-        const data = await res.json();
-
-        removeTypingIndicator(typingId);
-        appendMessage(data.response_text, 'ai', data.severity);
-        speak(data.response_text);
-
-        if (data.alert) {
-            triggerEmergencyBanner();
-            speakEmergency();
-        }
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+
+        let text = '';
+        let bubble = null;
+        await readSSE(res, (event, data) => {
+            if (event === 'done') {
+                removeTypingIndicator(typingId);
+                if (!bubble) bubble = appendMessage(text, 'ai', data.severity);
+                else setMessageSeverity(bubble, text, data.severity);
+                speak(text);
+                if (data.alert) {
+                    triggerEmergencyBanner();
+                    speakEmergency();
+                }
+                return;
+            }
+            text += data.delta || '';
+            if (!bubble) {
+                removeTypingIndicator(typingId);
+                bubble = appendMessage(text, 'ai');
+            } else {
+                bubble.querySelector('.msg-bubble').innerHTML = text;
+            }
+            document.getElementById('chatBox').scrollTop = document.getElementById('chatBox').scrollHeight;
+        });
 
     } catch (e) {
         removeTypingIndicator(typingId);
@@ -466,19 +492,46 @@ async function sendMessage() {
     }
 }
 
+// Read a text/event-stream body, calling onEvent(event, data) for each frame
+async function readSSE(res, onEvent) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = 'message';
+            let data = '';
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            onEvent(event, data ? JSON.parse(data) : {});
+        }
+    }
+}
+
 function appendMessage(text, sender, severity = "low") {
     const box = document.getElementById('chatBox');
     const div = document.createElement('div');
     div.className = `message ${sender}-msg`;
+    box.appendChild(div);
+    setMessageSeverity(div, text, sender === 'ai' ? severity : 'low');
+    box.scrollTop = box.scrollHeight;
+    return div;
+}
 
+function setMessageSeverity(div, text, severity) {
     let sevBadge = '';
-    if (sender === 'ai' && severity !== 'low' && severity) {
+    if (severity !== 'low' && severity) {
         sevBadge = `<br><span class="badge ${severity} mt-1" style="display:inline-block">${t('severity_label')}${severity}</span>`;
     }
-
     div.innerHTML = `<div class="msg-bubble">${text}${sevBadge}</div>`;
-    box.appendChild(div);
-    box.scrollTop = box.scrollHeight;
 }
 
 function appendTypingIndicator() {
@@ -0,0 +1,49 @@
+"""Regression tests for the responses.txt index (run with python -m pytest tests)."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_log import EventLog, LogIndex, log_field  # noqa: E402
+
+
+def appointment(patient):
+    return (f"[2026-01-01 10:00:00] APPOINTMENT | Patient: {patient} | Doctor: Dr. Rao | "
+            f"Date: 2026-01-02 | Time: 10:00 AM | Lang: English\n")
+
+
+def test_log_field_strips_line_breaks():
+    assert log_field("Evil\rName") == "Evil Name"
+    assert log_field("a\r\nb\nc") == "a b c"
+
+
+def test_stray_carriage_return_does_not_stall_index(tmp_path):
+    path = str(tmp_path / "responses.txt")
+    with open(path, "wb") as f:                 # a line written before log_field existed
+        f.write(appointment("Evil\rName").encode("utf-8"))
+    index = LogIndex(path)
+    index.refresh()
+    assert len(index) == 1
+
+    log = EventLog(path, fsync="never")
+    for i in range(4):
+        log.append(appointment(f"Patient {i}"))
+    log.close()
+    index.refresh()
+    assert len(index) == 5
+    assert LogIndex(path).query(patient="patient 3")[0]
+
+
+def test_unterminated_tail_waits_for_next_refresh(tmp_path):
+    path = str(tmp_path / "responses.txt")
+    line = appointment("Asha")
+    with open(path, "w") as f:
+        f.write(line[:20])
+    index = LogIndex(path)
+    index.refresh()
+    assert len(index) == 0
+    with open(path, "a") as f:
+        f.write(line[20:])
+    index.refresh()
+    assert len(index) == 1